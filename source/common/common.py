@@ -6,75 +6,127 @@ Twitter code is adapted from: https://gist.github.com/emaadmanzoor
 """
 import re
 import os
-import math
-import time
 import codecs
 
 import twitter
 
+from collections import OrderedDict
+from hydrator import Hydrator, HYDRATION_WORKERS, NOT_AVAILABLE_ERROR
+from tweet_store import TweetStore, NOT_AVAILABLE
 
-def get_tweets(tweet_ids, consumer_key, consumer_secret, access_token, access_token_secret, nlp):
+# The tweets downloaded by get_tweets, kept between runs in case the script stops working and re-starts
+TWEETS_DB = 'tweets.db'
+
+
+def get_tweets(tweet_ids, consumer_key, consumer_secret, access_token, access_token_secret, nlp=None,
+               tokenizer=None, workers=HYDRATION_WORKERS, tweets_db=TWEETS_DB):
     """
     Expands tweets from Twitter
     :param tweet_ids: the list of tweet IDs to expand
-    :return: a dictionary of tweet ID to tweet text
+    :param nlp: (optional) an already loaded spaCy model, to use its tokenizer
+    :param tokenizer: (optional) a TweetTokenizer with clean_tokens, e.g. to share the cleaned tweets between calls
+    :param workers: the maximal number of concurrent requests to the Twitter API
+    :param tweets_db: the TweetStore file of the tweets downloaded in this and previous runs
+    :return: a dictionary of tweet ID to tweet text (NOT_AVAILABLE for tweets which are not available, or
+    failed to download)
     """
+    tweets = download_tweets(tweet_ids, consumer_key, consumer_secret, access_token, access_token_secret, nlp,
+                             tokenizer, workers, tweets_db)
+
+    tweets_by_id = {}
+
+    try:
+        for tweet_id in set(tweet_ids):
+            tweet = tweets.get(tweet_id)
+            tweets_by_id[tweet_id] = tweet if tweet is not None else NOT_AVAILABLE
 
-    # Save tweets in a temporary file, in case the script stops working and re-starts
-    tweets = {}
-    if os.path.exists('tweet_temp'):
-        with codecs.open('tweet_temp', 'r', 'utf-8') as f_in:
-            lines = [tuple(line.strip().split('\t')) for line in f_in]
-            tweets = { tweet_id : tweet for (tweet_id, tweet) in lines }
+    finally:
+        tweets.close()
 
-    api = twitter.Api(consumer_key=consumer_key, consumer_secret=consumer_secret, access_token_key=access_token,
-                      access_token_secret=access_token_secret)
+    return tweets_by_id
 
-    [sleeptime, resettime] = reset_sleep_time(api)
 
-    with codecs.open('tweet_temp', 'a', 'utf-8') as f_out:
+def download_tweets(tweet_ids, consumer_key, consumer_secret, access_token, access_token_secret, nlp=None,
+                    tokenizer=None, workers=HYDRATION_WORKERS, tweets_db=TWEETS_DB):
+    """
+    Downloads the tweets which are not in the tweet store yet
+    :param tweet_ids: the tweet IDs to expand
+    :param nlp: (optional) an already loaded spaCy model, to use its tokenizer
+    :param tokenizer: (optional) a TweetTokenizer with clean_tokens, e.g. to share the cleaned tweets between calls
+    :param workers: the maximal number of concurrent requests to the Twitter API
+    :param tweets_db: the TweetStore file of the tweets downloaded in this and previous runs
+    :return: the open TweetStore, with the downloaded tweet IDs (None for tweets which are not available).
+    Tweets which failed to download are not saved, so that the next run downloads them again.
+    """
+    # Imported here, so that the scripts which only clean tweets (e.g. get_news_tweets_stream) don't load spaCy
+    from tweet_tokenizer import TweetTokenizer
 
-        for tweet_id in tweet_ids:
+    if tokenizer is None:
+        tokenizer = TweetTokenizer(clean_tokens, nlp)
 
-            # We didn't download this tweet yet
-            if not tweet_id in tweets:
-                try:
-                    curr_tweet = api.GetStatus(tweet_id, include_entities=False)
-                    tweets[tweet_id] = clean_tweet(' '.join([t.lower_ for t in nlp(curr_tweet.text)]))
+    # Save tweets in a store, in case the script stops working and re-starts. Tweets downloaded
+    # by older versions are imported from the temporary file.
+    import_tweet_temp = os.path.exists('tweet_temp') and not os.path.exists(tweets_db)
+    tweets = TweetStore(tweets_db)
 
-                except twitter.TwitterError as err:
-                    error = str(err)
+    if import_tweet_temp:
+        tweets.import_file('tweet_temp')
 
-                    # If the rate limit exceeded, this script should be stopped and resumed the next day
-                    if 'Rate limit exceeded' in error:
-                        raise
+    try:
+        api = twitter.Api(consumer_key=consumer_key, consumer_secret=consumer_secret, access_token_key=access_token,
+                          access_token_secret=access_token_secret)
 
-                    # Other error - the tweet is not available :(
-                    print 'Error reading tweet id:', tweet_id, ':', error
-                    tweets[tweet_id] = 'TWEET IS NOT AVAILABLE'
+        # The tweets we didn't download yet, each once
+        new_tweet_ids = [tweet_id for tweet_id in OrderedDict.fromkeys(tweet_ids) if not tweet_id in tweets]
 
-                print >> f_out, '\t'.join((tweet_id, tweets[tweet_id]))
+        # Download up to 100 tweets in each request, with several requests in flight. The tweets are returned
+        # in the input order, and saved in batches.
+        for tweet_id, status, error in Hydrator(api, workers).hydrate(new_tweet_ids):
 
-                time.sleep(sleeptime)
-                if time.time() >= resettime:
-                    [sleeptime, resettime] = reset_sleep_time(api)
+            if status is not None:
+                tweets[tweet_id] = tokenizer.clean_tweet(status.text)
 
+            # The tweet is not available :(
+            elif error == NOT_AVAILABLE_ERROR:
+                print 'Error reading tweet id:', tweet_id, ':', error
+                tweets[tweet_id] = None
+
+            # The request failed: don't save the tweet, so that the next run downloads it again
+            else:
+                print 'Error reading tweet id:', tweet_id, ':', error, '(will retry in the next run)'
+
+        tweets.commit()
+
+    # Save the tweets downloaded before an error, so that the next run continues from them
+    except BaseException:
+        tweets.close()
+        raise
+
+    print 'Twitter API requests:', api.GetRequestStats()
+    print 'Twitter API response cache:', api.GetCacheStats()
     return tweets
 
 
-def reset_sleep_time(api):
+def expand_resource_file(resource_file, expanded_file, consumer_key, consumer_secret, access_token,
+                         access_token_secret, workers=HYDRATION_WORKERS, tweets_db=TWEETS_DB):
     """
-    Sleep between API requests (from: https://gist.github.com/emaadmanzoor)
-    :param api: twitter API
-    :return: the sleep time and reset time
+    Add the tweets to a resource file without loading the resource: the resource is read once to collect
+    the tweet IDs, and once more to write the expanded instances, reading the tweets from the tweet store.
+    The memory is bounded by the set of tweet IDs.
+    :param resource_file: the original resource file (without tweets)
+    :param expanded_file: the expanded resource file (with tweets)
+    :param workers: the maximal number of concurrent requests to the Twitter API
+    :param tweets_db: the TweetStore file of the tweets downloaded in this and previous runs
+    :return: the number of instances written
     """
-    rate_limit_stats = api.GetRateLimitStatus()
-    show_status_limits = rate_limit_stats['resources']['statuses']['/statuses/show/:id']
-    hits_remaining = show_status_limits['remaining']
-    reset_time = show_status_limits['reset']
-    sleep_time = int(math.ceil((int(reset_time) - time.time()) * 1.0 / int(hits_remaining))) if hits_remaining > 0 else 5
-    print 'Sleeping', sleep_time, 'seconds between API hits until', reset_time
-    return sleep_time, reset_time
+    tweets = download_tweets(get_tweet_ids(read_resource(resource_file)), consumer_key, consumer_secret,
+                             access_token, access_token_secret, workers=workers, tweets_db=tweets_db)
+
+    try:
+        return save_to_file(expand_resource(read_resource(resource_file), tweets), expanded_file)
+
+    finally:
+        tweets.close()
 
 
 def load_resource(resource_file):
@@ -83,22 +135,32 @@ def load_resource(resource_file):
     :param resource_file: the resource file
     :return: the resource
     """
-    with codecs.open(resource_file, 'r', 'utf-8') as f_in:
-        resource = [tuple(line.strip().split('\t')) for line in f_in]
+    return list(read_resource(resource_file))
 
-    return resource
+
+def read_resource(resource_file):
+    """
+    Read a resource from a file, one instance at a time
+    :param resource_file: the resource file
+    :return: a generator of instances
+    """
+    with codecs.open(resource_file, 'r', 'utf-8') as f_in:
+        for line in f_in:
+            yield tuple(line.strip().split('\t'))
 
 
 def get_tweet_ids(resource):
     """
     Returns all the tweet IDs in the resource
-    :param resource: the resource
+    :param resource: the resource (a list of instances or a generator, e.g. read_resource)
     :return: all the tweet IDs in the resource
     """
-    tweet_ids = set([tweet_id1 for (tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1,
-                                    tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1) in resource] + \
-                [tweet_id2 for (tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1,
-                                tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1) in resource])
+    tweet_ids = set()
+
+    for (tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1,
+         tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1) in resource:
+        tweet_ids.add(tweet_id1)
+        tweet_ids.add(tweet_id2)
 
     return tweet_ids
 
@@ -107,27 +169,44 @@ def expand_resource(resource, sent_by_tweet_id):
     """
     Add the tweets to the resource
     :param resource: the original resource (without tweets)
-    :param sent_by_tweet_id: dictionary of tweet by tweet ID
-    :return: the expanded resource (with tweets)
+    :param sent_by_tweet_id: dictionary of tweet by tweet ID, or a TweetStore
+    (tweets which failed to download are not in the TweetStore)
+    :return: a generator of the expanded resource instances (with tweets)
     """
-    expanded_resource = [(tweet_id1, sent_by_tweet_id[tweet_id1], sf_pred1, pred1, sent1_a0, sent1_a1,
-                         tweet_id2, sent_by_tweet_id[tweet_id2], sf_pred2, pred2, sent2_a0, sent2_a1)
-                        for (tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1,
-                             tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1) in resource]
+    for (tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1,
+         tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1) in resource:
+
+        sent1, sent2 = sent_by_tweet_id.get(tweet_id1), sent_by_tweet_id.get(tweet_id2)
 
-    return expanded_resource
+        # Tweets which are not available are None in the TweetStore
+        yield (tweet_id1, sent1 if sent1 is not None else NOT_AVAILABLE, sf_pred1, pred1, sent1_a0, sent1_a1,
+               tweet_id2, sent2 if sent2 is not None else NOT_AVAILABLE, sf_pred2, pred2, sent2_a0, sent2_a1)
 
 
 def save_to_file(dataset, dataset_file):
     """
     Recives a dataset (list of tuples) and a file name and saves the dataset in a tab-separated file.
-    :param dataset: list of tuples
+    :param dataset: list of tuples, or a generator of tuples
     :param dataset_file: file name
-    :return:
+    :return: the number of tuples written
     """
+    count = 0
+
     with codecs.open(dataset_file, 'w', 'utf-8') as f_out:
         for item in dataset:
             print >> f_out, '\t'.join(item)
+            count += 1
+
+    return count
+
+
+def clean_tokens(tokens):
+    """
+    Receives the spaCy tokens of a tweet and returns the cleaned lowercased tweet
+    :param tokens: the spaCy tokens of the original tweet
+    :return: the cleaned tweet
+    """
+    return clean_tweet(' '.join([t.lower_ for t in tokens]))
 
 
 def clean_tweet(tweet):
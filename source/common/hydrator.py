@@ -0,0 +1,215 @@
+"""
+Download tweets by their IDs with several requests in flight, staying within the rate limit of statuses/lookup
+"""
+import time
+import urllib2
+import itertools
+import threading
+
+import twitter
+
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+HYDRATION_WORKERS = 4
+
+# The number of lookup requests submitted ahead of the one being read, per worker
+PENDING_REQUESTS_PER_WORKER = 2
+
+# The time to wait before asking for the rate limit again, when the window was not reset yet
+RATE_LIMIT_RETRY_TIME = 5
+
+# The number of times a failed lookup request is retried, e.g. when Twitter is over capacity
+LOOKUP_RETRIES = 3
+
+# The time to wait before retrying a failed lookup request, doubled after each retry
+LOOKUP_RETRY_TIME = 5
+
+# The error of the tweets missing from a successful lookup (deleted, protected or suspended)
+NOT_AVAILABLE_ERROR = 'the tweet is not available'
+
+
+class TokenBucket(object):
+    """
+    A token bucket shared between threads, which spreads the remaining requests of the rate limit window evenly
+    over the rest of the window, allowing bursts of up to `burst` requests. It never hands out more tokens
+    than the remaining requests in the window.
+    """
+    def __init__(self, get_limit, burst=1):
+        """
+        Initialize the bucket with the current rate limit
+        :param get_limit: a function that returns the remaining requests and the reset time of the current window
+        :param burst: the maximal number of tokens accumulated
+        """
+        self.get_limit = get_limit
+        self.burst = burst
+        self.lock = threading.Lock()
+        self.remaining, self.reset_time = get_limit()
+        self.tokens = min(burst, self.remaining)
+        self.last_time = time.time()
+
+    def acquire(self):
+        """
+        Wait until a request is allowed, and consume its token
+        """
+        while True:
+            with self.lock:
+                now = time.time()
+
+                # A new window: get its budget
+                if now >= self.reset_time:
+                    self.remaining, self.reset_time = self.get_limit()
+                    self.tokens = min(self.burst, self.remaining)
+                    self.last_time = now
+
+                self.refill(now)
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.remaining -= 1
+                    return
+
+                if self.remaining < 1 or self.reset_time <= now:
+                    wait_time = max(self.reset_time - now, RATE_LIMIT_RETRY_TIME)
+                else:
+                    wait_time = (1 - self.tokens) * (self.reset_time - now) / self.remaining
+
+            time.sleep(wait_time)
+
+    def refill(self, now):
+        """
+        Add the tokens accumulated since the last refill (called with the lock held)
+        :param now: the current time
+        """
+        if self.reset_time > self.last_time:
+            rate = self.remaining * 1.0 / (self.reset_time - self.last_time)
+            self.tokens = min(self.burst, self.remaining, self.tokens + rate * (now - self.last_time))
+
+        self.last_time = now
+
+    def update(self, remaining, reset_time):
+        """
+        Update the budget from the rate limit reported in a response
+        :param remaining: the remaining requests in the window
+        :param reset_time: the reset time of the window
+        """
+        with self.lock:
+
+            # A new window
+            if reset_time > self.reset_time:
+                self.remaining, self.reset_time = remaining, reset_time
+
+            # The requests in flight were already counted, so the reported number can only be lower
+            elif reset_time == self.reset_time:
+                self.remaining = min(self.remaining, remaining)
+
+            self.tokens = min(self.tokens, self.remaining)
+
+    def exhaust(self):
+        """
+        Stop handing out tokens until the window is reset, e.g. after the rate limit was exceeded
+        """
+        with self.lock:
+            self.remaining = self.tokens = 0
+
+
+class Hydrator(object):
+    """
+    Downloads tweets with concurrent statuses/lookup requests of up to 100 tweets, limited by a token bucket
+    fed from GetRateLimitStatus and from the rate limit headers of the responses.
+    """
+    def __init__(self, api, workers=HYDRATION_WORKERS):
+        """
+        Initialize the hydrator
+        :param api: twitter API, shared by the worker threads
+        :param workers: the maximal number of requests in flight
+        """
+        self.api = api
+        self.workers = workers
+        self.limiter = TokenBucket(lambda: get_lookup_rate_limit(api), burst=workers)
+        api.SetRateLimitListener(self.on_rate_limit)
+
+    def hydrate(self, tweet_ids):
+        """
+        Download tweets by their IDs
+        :param tweet_ids: an iterable of tweet IDs, each once
+        :return: a generator of (tweet ID, status, error) in the input order. The status is None if the tweet
+        was not downloaded, and error is the reason: NOT_AVAILABLE_ERROR if the tweet is not available, or the error
+        of the request if it failed, in which case the tweet should be downloaded again later.
+        """
+        tweet_ids = iter(tweet_ids)
+        batches = iter(lambda: list(itertools.islice(tweet_ids, twitter.Api.MAX_STATUSES_PER_LOOKUP)), [])
+        pool = ThreadPool(self.workers)
+        pending = deque()
+
+        try:
+            for batch in itertools.chain(batches, [None]):
+
+                if batch is not None:
+                    pending.append(pool.apply_async(self.lookup, (batch,)))
+
+                # Read the results of the oldest requests, to keep the input order
+                while len(pending) >= self.workers * PENDING_REQUESTS_PER_WORKER or \
+                        (batch is None and len(pending) > 0):
+                    batch_ids, statuses, error = pending.popleft().get()
+
+                    for tweet_id in batch_ids:
+                        status = statuses.get(tweet_id, None)
+                        yield tweet_id, status, error if status is None else None
+
+        finally:
+            pool.terminate()
+
+    def lookup(self, batch):
+        """
+        Download up to 100 tweets in a single request, waiting for the rate limit. A failed request is retried
+        with an increasing delay, since most errors are transient (e.g. "Over capacity" or "Internal error").
+        :param batch: the tweet IDs
+        :return: the tweet IDs, a dictionary of status by tweet ID for the available tweets, and the error message
+        (NOT_AVAILABLE_ERROR if the request succeeded)
+        """
+        retries = 0
+
+        while True:
+            self.limiter.acquire()
+
+            try:
+                statuses = self.api.StatusesLookup(batch, include_entities=False)
+                return batch, { str(status.id) : status for status in statuses }, NOT_AVAILABLE_ERROR
+
+            except twitter.TwitterError as err:
+                error = str(err)
+
+                # Wait until the rate limit is reset and try again
+                if 'Rate limit exceeded' in error:
+                    self.limiter.exhaust()
+                    continue
+
+            except urllib2.URLError as err:
+                error = str(err)
+
+            if retries == LOOKUP_RETRIES:
+                return batch, {}, error
+
+            time.sleep(LOOKUP_RETRY_TIME * 2 ** retries)
+            retries += 1
+
+    def on_rate_limit(self, url, remaining, reset_time):
+        """
+        Update the token bucket from the rate limit headers of a statuses/lookup response
+        :param url: the request URL
+        :param remaining: the remaining requests in the window
+        :param reset_time: the reset time of the window
+        """
+        if '/statuses/lookup' in url:
+            self.limiter.update(remaining, reset_time)
+
+
+def get_lookup_rate_limit(api):
+    """
+    Returns the rate limit of statuses/lookup
+    :param api: twitter API
+    :return: the remaining requests and the reset time of the current window
+    """
+    lookup_limits = api.GetRateLimitStatus()['resources']['statuses']['/statuses/lookup']
+    return int(lookup_limits['remaining']), int(lookup_limits['reset'])
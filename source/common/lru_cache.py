@@ -0,0 +1,95 @@
+"""
+A bounded memoization cache for expensive lookups that repeat across and within runs
+(e.g. WordNet synonyms of argument words), with an optional persistent layer on disk.
+"""
+import shelve
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A least-recently-used cache of computed values, bounded by the number of items kept in memory.
+    If a persistent file is given, computed values are also stored in it, and are loaded from it
+    instead of being recomputed in later runs.
+    """
+    def __init__(self, compute, max_size=100000, persistent_file=None):
+        """
+        Initialize the cache
+        :param compute: a function that computes the value of a key (None if the value is computed by get)
+        :param max_size: the maximal number of items kept in memory
+        :param persistent_file: the path of the on-disk cache (None for an in-memory cache only)
+        """
+        self.compute = compute
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.persistent = shelve.open(persistent_file, protocol=2) if persistent_file is not None else None
+        self.hits = self.persistent_hits = self.misses = 0
+
+    def __getitem__(self, key):
+        """
+        Get the value of a key, computing it if it is not cached
+        :param key: the key
+        :return: the value of the key
+        """
+        return self.get(key)
+
+    def get(self, key, compute=None):
+        """
+        Get the value of a key, computing it if it is not cached
+        :param key: the key
+        :param compute: a function without arguments that computes the value of this key, e.g. when the key is
+        a hash of the input (default: the cache's compute function applied to the key)
+        :return: the value of the key
+        """
+        if key in self.cache:
+            self.hits += 1
+            value = self.cache.pop(key)
+            self.cache[key] = value
+            return value
+
+        persistent_key = key.encode('utf-8') if isinstance(key, unicode) else str(key)
+
+        if self.persistent is not None and persistent_key in self.persistent:
+            self.persistent_hits += 1
+            value = self.persistent[persistent_key]
+        else:
+            self.misses += 1
+            value = compute() if compute is not None else self.compute(key)
+            if self.persistent is not None:
+                self.persistent[persistent_key] = value
+
+        self.cache[key] = value
+
+        # Evict the least recently used item
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+        return value
+
+    def __len__(self):
+        return len(self.cache)
+
+    def stats(self):
+        """
+        Returns a textual summary of the cache hits and misses
+        :return: a textual summary of the cache hits and misses
+        """
+        total = self.hits + self.persistent_hits + self.misses
+        return '%d lookups: %d hits, %d persistent hits, %d misses (hit rate: %.2f%%)' % \
+               (total, self.hits, self.persistent_hits, self.misses,
+                100.0 * (self.hits + self.persistent_hits) / total if total > 0 else 0.0)
+
+    def detach_persistent(self):
+        """
+        Stop using the persistent layer without closing it, e.g. in a forked process that shares it with its parent
+        """
+        self.persistent = None
+
+    def close(self):
+        """
+        Save and close the persistent layer
+        """
+        if self.persistent is not None:
+            self.persistent.close()
+            self.persistent = None
@@ -0,0 +1,183 @@
+"""
+Tests of the tweet hydration with statuses/lookup, against a local HTTP stub of the Twitter API
+(run from this directory: python -m unittest test_hydrator)
+"""
+import json
+import time
+import urlparse
+import unittest
+import threading
+import SocketServer
+import BaseHTTPServer
+
+import twitter
+import hydrator
+
+from hydrator import Hydrator, NOT_AVAILABLE_ERROR
+
+# The responses of Twitter to a request which exceeded the rate limit, and to a request when it is over capacity
+RATE_LIMIT_EXCEEDED = (429, {'errors': [{'code': 88, 'message': 'Rate limit exceeded'}]})
+OVER_CAPACITY = (503, {'errors': [{'code': 130, 'message': 'Over capacity'}]})
+
+
+class TwitterStub(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    A local server of rate_limit_status and statuses/lookup. The tweets with IDs divisible by 7 are not available,
+    and the available tweets are returned in the reverse order of the request. The lookup requests are answered
+    first with the responses in `errors`, one per request (a string is returned as is, and other responses as JSON).
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), TwitterStubHandler)
+        self.lock = threading.Lock()
+        self.lookups = []
+        self.errors = []
+        self.remaining = 900
+
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def base_url(self):
+        return 'http://127.0.0.1:{}'.format(self.server_port)
+
+    def lookup(self, tweet_ids):
+        """
+        Returns the response to a lookup request
+        :param tweet_ids: the requested tweet IDs
+        :return: the HTTP status and the response
+        """
+        with self.lock:
+            self.lookups.append(tweet_ids)
+            self.remaining -= 1
+
+            if len(self.errors) > 0:
+                return self.errors.pop(0)
+
+        return 200, [{'id': int(tweet_id), 'text': 'tweet {}'.format(tweet_id)}
+                     for tweet_id in reversed(tweet_ids) if int(tweet_id) % 7 != 0]
+
+
+class TwitterStubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+
+        if url.path.endswith('/statuses/lookup.json'):
+            status, response = self.server.lookup(urlparse.parse_qs(url.query)['id'][0].split(','))
+
+        elif url.path.endswith('/application/rate_limit_status.json'):
+            status, response = 200, {'resources': {'statuses': {'/statuses/lookup': {
+                'remaining': self.server.remaining, 'reset': reset_time()}}}}
+
+        else:
+            status, response = 404, {'errors': [{'code': 34, 'message': 'Sorry, that page does not exist'}]}
+
+        # An error page instead of JSON, e.g. from a proxy
+        data = response if isinstance(response, str) else json.dumps(response)
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('x-rate-limit-remaining', str(self.server.remaining))
+        self.send_header('x-rate-limit-reset', str(reset_time()))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def reset_time():
+    """
+    Returns the reset time of the stub's rate limit window, which is reset every second
+    :return: the reset time of the current window
+    """
+    return int(time.time()) + 1
+
+
+class TwitterStubTestCase(unittest.TestCase):
+    """
+    A test with a TwitterStub server and an Api of the stub
+    """
+    def setUp(self):
+        self.stub = TwitterStub()
+        self.api = twitter.Api(base_url=self.stub.base_url())
+
+    def tearDown(self):
+        self.stub.shutdown()
+        self.stub.server_close()
+
+
+class StatusesLookupTest(TwitterStubTestCase):
+
+    def test_lookup(self):
+        statuses = self.api.StatusesLookup(['1', '2', '7'])
+        self.assertEqual([(2, 'tweet 2'), (1, 'tweet 1')], [(status.id, status.text) for status in statuses])
+        self.assertEqual([['1', '2', '7']], self.stub.lookups)
+
+    def test_too_many_ids(self):
+        self.assertRaises(twitter.TwitterError, self.api.StatusesLookup,
+                          range(twitter.Api.MAX_STATUSES_PER_LOOKUP + 1))
+        self.assertRaises(twitter.TwitterError, self.api.StatusesLookup, [])
+        self.assertEqual([], self.stub.lookups)
+
+
+class HydratorTest(TwitterStubTestCase):
+
+    def setUp(self):
+        TwitterStubTestCase.setUp(self)
+
+        # Don't wait between the retries
+        self.retry_times = hydrator.RATE_LIMIT_RETRY_TIME, hydrator.LOOKUP_RETRY_TIME
+        hydrator.RATE_LIMIT_RETRY_TIME = hydrator.LOOKUP_RETRY_TIME = 0
+
+    def tearDown(self):
+        hydrator.RATE_LIMIT_RETRY_TIME, hydrator.LOOKUP_RETRY_TIME = self.retry_times
+        TwitterStubTestCase.tearDown(self)
+
+    def hydrate(self, tweet_ids):
+        return list(Hydrator(self.api, workers=2).hydrate(tweet_ids))
+
+    def assertHydrated(self, tweet_ids, results):
+        self.assertEqual(tweet_ids, [tweet_id for tweet_id, status, error in results])
+
+        for tweet_id, status, error in results:
+            if int(tweet_id) % 7 == 0:
+                self.assertEqual((None, NOT_AVAILABLE_ERROR), (status, error))
+            else:
+                self.assertEqual(('tweet {}'.format(tweet_id), None), (status.text, error))
+
+    def test_batches(self):
+        tweet_ids = [str(i) for i in range(1000, 1250)]
+        results = self.hydrate(tweet_ids)
+        self.assertHydrated(tweet_ids, results)
+
+        # 100 tweets in each request, and each tweet once
+        self.assertEqual([50, 100, 100], sorted(len(lookup) for lookup in self.stub.lookups))
+        self.assertEqual(sorted(tweet_ids), sorted(sum(self.stub.lookups, [])))
+
+    def test_rate_limit_exceeded(self):
+        self.stub.errors = [RATE_LIMIT_EXCEEDED]
+        tweet_ids = [str(i) for i in range(1, 21)]
+        self.assertHydrated(tweet_ids, self.hydrate(tweet_ids))
+        self.assertEqual(2, len(self.stub.lookups))
+
+    def test_transient_error(self):
+        self.stub.errors = [OVER_CAPACITY, (503, '<html>Service Unavailable</html>')]
+        tweet_ids = [str(i) for i in range(1, 21)]
+        self.assertHydrated(tweet_ids, self.hydrate(tweet_ids))
+        self.assertEqual(3, len(self.stub.lookups))
+
+    def test_failed_request(self):
+        self.stub.errors = [OVER_CAPACITY] * (hydrator.LOOKUP_RETRIES + 1)
+        tweet_ids = [str(i) for i in range(1, 21)]
+        results = self.hydrate(tweet_ids)
+
+        # The tweets are not marked as not available, so that they are downloaded again later
+        self.assertEqual(tweet_ids, [tweet_id for tweet_id, status, error in results])
+        self.assertTrue(all(status is None and error != NOT_AVAILABLE_ERROR for tweet_id, status, error in results))
+        self.assertIn('Over capacity', results[0][2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Tests of the kept-alive connections of twitter.Api, against a local HTTP stub (run from this directory:
+python -m unittest test_twitter)
+"""
+import os
+import json
+import urllib2
+import unittest
+import threading
+import SocketServer
+import BaseHTTPServer
+
+import twitter
+
+
+class KeepAliveStub(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    A local HTTP/1.1 server that keeps the connections alive and counts them. With `close_connections`, it closes
+    each connection after the response without telling the client, as a server does with idle connections.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), KeepAliveStubHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.close_connections = False
+
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def url(self, host='127.0.0.1'):
+        return 'http://{}:{}'.format(host, self.server_port)
+
+
+class KeepAliveStubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+
+        data = json.dumps({'resources': {}})
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+        self.close_connection = int(self.server.close_connections)
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = KeepAliveStub()
+        self.api = twitter.Api(base_url=self.stub.url())
+
+        # The kept-alive connections are not used with a proxy
+        self.proxies = { name : os.environ.pop(name) for name in ['http_proxy', 'https_proxy']
+                         if name in os.environ }
+
+    def tearDown(self):
+        os.environ.update(self.proxies)
+
+        # Close the kept-alive connections, so that the stub stops waiting for their next requests
+        self.api._connection_pool.Close()
+        self.stub.shutdown()
+        self.stub.server_close()
+
+    def test_reuse(self):
+        for i in range(10):
+            self.api.GetRateLimitStatus()
+
+        self.assertEqual((10, 1), (self.stub.requests, self.stub.connections))
+
+        stats = self.api.GetRequestStats()
+        self.assertEqual((10, 1, 9, 0), (stats['requests'], stats['new_connections'], stats['reused_connections'],
+                                         stats['errors']))
+        self.assertGreater(stats['total_latency'], 0)
+        self.assertLessEqual(stats['max_latency'], stats['total_latency'])
+        self.assertAlmostEqual(stats['total_latency'] / 10, stats['average_latency'])
+
+    def test_reuse_per_host(self):
+        pool = twitter._ConnectionPool()
+
+        for i in range(5):
+            for host in ['127.0.0.1', 'localhost']:
+                self.assertEqual(200, pool.Request('GET', self.stub.url(host) + '/1.1/test.json').status)
+
+        self.assertEqual((10, 2), (self.stub.requests, self.stub.connections))
+        self.assertEqual(2, pool.GetStats()['new_connections'])
+        pool.Close()
+
+    def test_threads(self):
+        threads = [threading.Thread(target=lambda: [self.api.GetRateLimitStatus() for i in range(20)])
+                   for j in range(4)]
+        [thread.start() for thread in threads]
+        [thread.join() for thread in threads]
+
+        # At most one connection per thread
+        stats = self.api.GetRequestStats()
+        self.assertEqual(80, self.stub.requests)
+        self.assertLessEqual(self.stub.connections, 4)
+        self.assertEqual((80, self.stub.connections), (stats['requests'], stats['new_connections']))
+
+    def test_closed_by_server(self):
+        self.stub.close_connections = True
+
+        for i in range(3):
+            self.api.GetRateLimitStatus()
+
+        # Each request found its connection closed by the server, and was sent again on a new connection
+        self.assertEqual((3, 3), (self.stub.requests, self.stub.connections))
+
+        stats = self.api.GetRequestStats()
+        self.assertEqual((3, 3, 0, 0), (stats['requests'], stats['new_connections'], stats['reused_connections'],
+                                        stats['errors']))
+
+    def test_connection_error(self):
+        self.stub.shutdown()
+        self.stub.server_close()
+        self.assertRaises(urllib2.URLError, self.api.GetRateLimitStatus)
+
+        stats = self.api.GetRequestStats()
+        self.assertEqual((1, 1), (stats['requests'], stats['errors']))
+
+    def test_keep_alive_off(self):
+        api = twitter.Api(base_url=self.stub.url(), keep_alive=False)
+
+        for i in range(3):
+            api.GetRateLimitStatus()
+
+        self.assertEqual((3, 3), (self.stub.requests, self.stub.connections))
+        self.assertIsNone(api.GetRequestStats())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+Usage:
+    tweet_store.py compact <tweets_db>
+    tweet_store.py import <tweets_db> <tweets_file>
+
+A persistent store of downloaded tweets by tweet ID, shared by the scripts that expand tweets.
+compact: commit the pending writes and rebuild the database file without the free space.
+import: add the tweets of a tab-separated file of tweet ID and tweet (e.g. an old tweet_temp file).
+"""
+import os
+import codecs
+import sqlite3
+
+# The number of writes committed together
+WRITE_BATCH_SIZE = 1000
+
+# Marks the tweets which are not available in tab-separated tweets files
+NOT_AVAILABLE = 'TWEET IS NOT AVAILABLE'
+
+
+def main():
+
+    # Imported here, since the store is also imported by scripts without the command line interface
+    from docopt import docopt
+
+    args = docopt(__doc__)
+    store = TweetStore(args['<tweets_db>'])
+
+    if args['compact']:
+        size = os.path.getsize(args['<tweets_db>'])
+        store.compact()
+        print 'Compacted {}: {} tweets, {} -> {} bytes'.format(args['<tweets_db>'], len(store), size,
+                                                               os.path.getsize(args['<tweets_db>']))
+
+    elif args['import']:
+        count = store.import_file(args['<tweets_file>'])
+        print 'Imported {} tweets from {}'.format(count, args['<tweets_file>'])
+
+    store.close()
+
+
+class TweetStore(object):
+    """
+    Tweets by tweet ID in a SQLite database, indexed by the tweet ID. The text is stored as is, including tabs
+    and newlines, and None marks tweets which are not available. Writes are committed in batches, each
+    in a single transaction, so a crash loses at most the last uncommitted batch and never corrupts the store.
+    """
+    def __init__(self, db_file, batch_size=WRITE_BATCH_SIZE):
+        """
+        Open the store, creating it if it doesn't exist
+        :param db_file: the database file
+        :param batch_size: the number of writes committed together
+        """
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.pending = {}
+        self.connection = sqlite3.connect(db_file)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tweets (tweet_id TEXT PRIMARY KEY, tweet TEXT)')
+        self.connection.commit()
+
+    def __contains__(self, tweet_id):
+        """
+        Returns whether the tweet was stored (including tweets which are not available)
+        :param tweet_id: the tweet ID
+        :return: whether the tweet was stored
+        """
+        return tweet_id in self.pending or self.select(tweet_id) is not None
+
+    def __getitem__(self, tweet_id):
+        """
+        Returns the stored tweet
+        :param tweet_id: the tweet ID
+        :return: the tweet, or None if the tweet is not available
+        """
+        if tweet_id in self.pending:
+            return self.pending[tweet_id]
+
+        row = self.select(tweet_id)
+
+        if row is None:
+            raise KeyError(tweet_id)
+
+        return row[0]
+
+    def get(self, tweet_id, default=None):
+        """
+        Returns the stored tweet, or the default if it was not stored (e.g. its download failed)
+        :param tweet_id: the tweet ID
+        :param default: the value to return if the tweet was not stored
+        :return: the tweet, None if the tweet is not available, or the default if the tweet was not stored
+        """
+        if tweet_id in self.pending:
+            return self.pending[tweet_id]
+
+        row = self.select(tweet_id)
+        return row[0] if row is not None else default
+
+    def __setitem__(self, tweet_id, tweet):
+        """
+        Store a tweet. It is committed with the next batch of writes.
+        :param tweet_id: the tweet ID
+        :param tweet: the tweet, or None if the tweet is not available
+        """
+        self.pending[tweet_id] = tweet
+
+        if len(self.pending) >= self.batch_size:
+            self.commit()
+
+    def __len__(self):
+        self.commit()
+        return self.connection.execute('SELECT COUNT(*) FROM tweets').fetchone()[0]
+
+    def select(self, tweet_id):
+        """
+        Returns the row of a committed tweet
+        :param tweet_id: the tweet ID
+        :return: a tuple with the tweet, or None if the tweet was not stored
+        """
+        return self.connection.execute('SELECT tweet FROM tweets WHERE tweet_id = ?', (tweet_id,)).fetchone()
+
+    def commit(self):
+        """
+        Write the pending tweets in a single transaction
+        """
+        if len(self.pending) == 0:
+            return
+
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO tweets (tweet_id, tweet) VALUES (?, ?)',
+                                        self.pending.iteritems())
+
+        self.pending = {}
+
+    def import_file(self, tweets_file):
+        """
+        Add the tweets of a tab-separated file of tweet ID and tweet
+        :param tweets_file: the tweets file
+        :return: the number of tweets read
+        """
+        count = 0
+
+        with codecs.open(tweets_file, 'r', 'utf-8') as f_in:
+            for line in f_in:
+                tweet_id, tweet = line.rstrip('\n').split('\t', 1)
+                self[tweet_id] = tweet if tweet != NOT_AVAILABLE else None
+                count += 1
+
+        self.commit()
+        return count
+
+    def compact(self):
+        """
+        Commit the pending tweets and rebuild the database file without the free space
+        """
+        self.commit()
+        self.connection.execute('VACUUM')
+        self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self):
+        """
+        Commit the pending tweets and close the store
+        """
+        self.commit()
+        self.connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Tokenize and clean downloaded tweets with spaCy's tokenizer only (the tagger and parser are not needed
+to re-join the tokens), caching the cleaned text by the hash of the tweet content.
+"""
+import hashlib
+
+from spacy.en import English
+from lru_cache import LRUCache
+
+CLEANED_TWEETS_CACHE_SIZE = 100000
+
+
+class TweetTokenizer(object):
+    """
+    Cleans tweet texts, processing identical texts (retweets, syndicated headlines) only once.
+    spaCy is only loaded when a text which is not in the cache needs to be tokenized.
+    """
+    def __init__(self, clean, nlp=None, max_size=CLEANED_TWEETS_CACHE_SIZE, persistent_file=None):
+        """
+        Initialize the tokenizer
+        :param clean: a function that receives the spaCy tokens of a tweet and its additional context
+        (e.g. hashtags) and returns the cleaned tweet. It should be the same for all the texts in the cache.
+        :param nlp: an already loaded spaCy model to use the tokenizer of (None to load one only when needed)
+        :param max_size: the maximal number of cleaned tweets kept in memory
+        :param persistent_file: the path of the on-disk cache of cleaned tweets (None for an in-memory cache only)
+        """
+        self.clean = clean
+        self.nlp = nlp
+        self.cleaned_tweets = LRUCache(None, max_size, persistent_file)
+
+    def clean_tweet(self, text, *context):
+        """
+        Returns the cleaned tweet, tokenizing and cleaning it only if the same content wasn't cleaned before
+        :param text: the tweet text
+        :param context: additional input of the clean function (e.g. hashtags, urls), part of the cache key
+        :return: the cleaned tweet
+        """
+        return self.cleaned_tweets.get(content_hash(text, *context),
+                                       lambda: self.clean(self.tokenize(text), *context))
+
+    def tokenize(self, text):
+        """
+        Tokenize a text without tagging and parsing it
+        :param text: the text
+        :return: the spaCy tokens
+        """
+        if self.nlp is None:
+            self.nlp = English(tagger=False, parser=False, entity=False)
+
+        return self.nlp.tokenizer(text)
+
+    def stats(self):
+        """
+        Returns a textual summary of the cache hits and misses
+        :return: a textual summary of the cache hits and misses
+        """
+        return self.cleaned_tweets.stats()
+
+    def close(self):
+        """
+        Save and close the on-disk cache
+        """
+        self.cleaned_tweets.close()
+
+
+def content_hash(text, *context):
+    """
+    Returns the hash of a tweet text and its additional context
+    :param text: the tweet text
+    :param context: sets, lists or dictionaries (e.g. hashtags, urls, user mentions)
+    :return: the hexadecimal hash
+    """
+    content = hashlib.sha1(text.encode('utf-8') if isinstance(text, unicode) else text)
+
+    for item in context:
+        content.update('\0' + repr(sorted(item.items()) if isinstance(item, dict) else sorted(item)))
+
+    return content.hexdigest()
@@ -25,15 +25,20 @@ import datetime
 import httplib
 import os
 import rfc822
+import socket
 import sys
 import tempfile
 import textwrap
+import threading
 import time
 import urllib
 import urllib2
 import urlparse
 import gzip
 import StringIO
+import sqlite3
+
+from collections import OrderedDict
 
 try:
   # Python >= 2.6
@@ -65,9 +70,15 @@ import oauth2 as oauth
 
 CHARACTER_LIMIT = 140
 
-# A singleton representing a lazily instantiated FileCache.
+# A singleton representing a lazily instantiated MemoryCache.
 DEFAULT_CACHE = object()
 
+# The maximal number of responses kept by the default cache
+DEFAULT_CACHE_SIZE = 100
+
+# The database file of SqliteCache
+DEFAULT_CACHE_FILE = 'twitter_cache.db'
+
 REQUEST_TOKEN_URL = 'https://api.twitter.com/oauth/request_token'
 ACCESS_TOKEN_URL  = 'https://api.twitter.com/oauth/access_token'
 AUTHORIZATION_URL = 'https://api.twitter.com/oauth/authorize'
@@ -2152,6 +2163,7 @@ class Api(object):
       >>> api.GetReplies()
       >>> api.GetUserTimeline(user)
       >>> api.GetStatus(id)
+      >>> api.StatusesLookup(ids)
       >>> api.DestroyStatus(id)
       >>> api.GetFriendsTimeline(user)
       >>> api.GetFriends(user)
@@ -2168,6 +2180,7 @@ class Api(object):
   '''
 
   DEFAULT_CACHE_TIMEOUT = 60 # cache for 1 minute
+  MAX_STATUSES_PER_LOOKUP = 100 # the maximal number of ids in a statuses/lookup request
   _API_REALM = 'Twitter API'
 
   def __init__(self,
@@ -2181,7 +2194,10 @@ class Api(object):
                shortner=None,
                base_url=None,
                use_gzip_compression=False,
-               debugHTTP=False):
+               debugHTTP=False,
+               keep_alive=True,
+               timeout=None,
+               ssl_context=None):
     '''Instantiate a new twitter.Api object.
 
     Args:
@@ -2214,6 +2230,16 @@ class Api(object):
       debugHTTP:
         Set to True to enable debug output from urllib2 when performing
         any HTTP requests.  Defaults to False. [Optional]
+      keep_alive:
+        Set to False to open a new connection for every request instead
+        of reusing kept-alive connections to the same host.
+        Defaults to True. [Optional]
+      timeout:
+        The timeout in seconds of the kept-alive connections.
+        Defaults to None, the global socket timeout. [Optional]
+      ssl_context:
+        The ssl.SSLContext of the kept-alive HTTPS connections.
+        Defaults to None, the default context. [Optional]
     '''
     self.SetCache(cache)
     self._urllib         = urllib2
@@ -2223,6 +2249,14 @@ class Api(object):
     self._debugHTTP      = debugHTTP
     self._oauth_consumer = None
     self._shortlink_size = 19
+    self._rate_limit_listener = None
+
+    if keep_alive:
+      self._connection_pool = _ConnectionPool(timeout=timeout,
+                                              ssl_context=ssl_context,
+                                              debuglevel=1 if debugHTTP else 0)
+    else:
+      self._connection_pool = None
 
     self._InitializeRequestHeaders(request_headers)
     self._InitializeUserAgent()
@@ -2753,6 +2787,56 @@ class Api(object):
     data = self._ParseAndCheckTwitter(json)
     return Status.NewFromJsonDict(data)
 
+  def StatusesLookup(self, ids, include_entities=None, trim_user=None):
+    '''Returns up to 100 status messages in a single request.
+
+    Statuses which are not available (deleted, protected or suspended)
+    are not included in the result.
+
+    Args:
+      ids:
+        A list of the numeric IDs of the statuses you are trying to
+        retrieve, at most MAX_STATUSES_PER_LOOKUP.
+      include_entities:
+        If True, each tweet will include a node called "entities".
+        This node offers a variety of metadata about the tweet in a
+        discreet structure, including: user_mentions, urls, and
+        hashtags. [Optional]
+      trim_user:
+        If True, each tweet will include only the user ID instead of
+        the complete user object. [Optional]
+    Returns:
+      A list of twitter.Status instances, for the available statuses
+    '''
+    if not ids:
+      raise TwitterError("Specify at least one status id.")
+    if len(ids) > Api.MAX_STATUSES_PER_LOOKUP:
+      raise TwitterError("Specify at most %d status ids." % Api.MAX_STATUSES_PER_LOOKUP)
+    try:
+      ids = [long(id) for id in ids]
+    except:
+      raise TwitterError("id must be an long integer")
+
+    parameters = {'id': ','.join(["%d" % id for id in ids])}
+    if include_entities:
+      parameters['include_entities'] = 1
+    if trim_user:
+      parameters['trim_user'] = 1
+
+    # Not cached: the statuses are downloaded once, and an error response
+    # (e.g. over capacity) must not be returned again when retrying
+    url  = '%s/statuses/lookup.json' % self.base_url
+    json = self._FetchUrl(url, parameters=parameters, no_cache=True)
+    try:
+      data = self._ParseAndCheckTwitter(json)
+    except TwitterError as e:
+      t = e.args[0]
+      if len(t) == 1 and ('code' in t[0]) and (t[0]['code'] == 34):
+        data = []
+      else:
+        raise
+    return [Status.NewFromJsonDict(x) for x in data]
+
   def DestroyStatus(self, id):
     '''Destroys the status specified by the required ID parameter.
 
@@ -3659,13 +3743,49 @@ class Api(object):
 
     Args:
       cache:
-        An instance that supports the same API as the twitter._FileCache
+        An instance that supports the same API as the twitter._FileCache,
+        e.g. twitter.MemoryCache (the default) or twitter.SqliteCache
     '''
     if cache == DEFAULT_CACHE:
-      self._cache = _FileCache()
+      self._cache = MemoryCache()
     else:
       self._cache = cache
 
+  def GetCacheStats(self):
+    '''Returns the hit and miss counters of the response cache.
+
+    Returns:
+      A dictionary with the number of lookups, hits, misses, stored,
+      evicted and expired responses, and the number of cached responses.
+      None if there is no cache or it doesn't count them.
+    '''
+    if not hasattr(self._cache, 'GetStats'):
+      return None
+    return self._cache.GetStats()
+
+  def GetRequestStats(self):
+    '''Returns the request counters of the kept-alive connections.
+
+    Returns:
+      A dictionary with the number of requests, the number of new and
+      reused connections, the number of failed requests, and the total,
+      average and maximal latency in seconds. None if keep_alive is off.
+    '''
+    if self._connection_pool is None:
+      return None
+    return self._connection_pool.GetStats()
+
+  def SetRateLimitListener(self, listener):
+    '''Set a function to call with the rate limit reported in each response.
+
+    Args:
+      listener:
+        A function that receives the request URL, the remaining requests
+        and the reset time (in seconds since the epoch) of the rate limit
+        window of the endpoint. None to stop calling it.
+    '''
+    self._rate_limit_listener = listener
+
   def SetUrllib(self, urllib):
     '''Override the default urllib implementation.
 
@@ -3933,38 +4053,11 @@ class Api(object):
     else:
       http_method = "GET"
 
-    if self._debugHTTP:
-      _debug = 1
-    else:
-      _debug = 0
-
-    http_handler  = self._urllib.HTTPHandler(debuglevel=_debug)
-    https_handler = self._urllib.HTTPSHandler(debuglevel=_debug)
-    http_proxy = os.environ.get('http_proxy')
-    https_proxy = os.environ.get('https_proxy')
-
-    if http_proxy is None or  https_proxy is None :
-      proxy_status = False
-    else :
-      proxy_status = True
-
-    opener = self._urllib.OpenerDirector()
-    opener.add_handler(http_handler)
-    opener.add_handler(https_handler)
-
-    if proxy_status is True :
-      proxy_handler = self._urllib.ProxyHandler({'http':str(http_proxy),'https': str(https_proxy)})
-      opener.add_handler(proxy_handler)
-
     if use_gzip_compression is None:
       use_gzip = self._use_gzip
     else:
       use_gzip = use_gzip_compression
 
-    # Set up compression
-    if use_gzip and not post_data:
-      opener.addheaders.append(('Accept-Encoding', 'gzip'))
-
     if self._oauth_consumer is not None:
       if post_data and http_method == "POST":
         parameters = post_data.copy()
@@ -3989,9 +4082,7 @@ class Api(object):
 
     # Open and return the URL immediately if we're not going to cache
     if encoded_post_data or no_cache or not self._cache or not self._cache_timeout:
-      response = opener.open(url, encoded_post_data)
-      url_data = self._DecompressGzippedResponse(response)
-      opener.close()
+      url_data = self._OpenUrl(url, encoded_post_data, use_gzip)
     else:
       # Unique keys are a combination of the url and the oAuth Consumer Key
       if self._consumer_key:
@@ -4005,18 +4096,449 @@ class Api(object):
       # If the cached version is outdated then fetch another and store it
       if not last_cached or time.time() >= last_cached + self._cache_timeout:
         try:
-          response = opener.open(url, encoded_post_data)
-          url_data = self._DecompressGzippedResponse(response)
+          url_data = self._OpenUrl(url, encoded_post_data, use_gzip)
           self._cache.Set(key, url_data)
         except (urllib2.HTTPError, urllib2.URLError) as e:
           print e
-        opener.close()
       else:
         url_data = self._cache.Get(key)
 
     # Always return the latest version
     return url_data
 
+  def _OpenUrl(self, url, encoded_post_data=None, use_gzip=False):
+    '''Open a URL, reusing a kept-alive connection to its host unless a
+    proxy is configured or keep_alive is off.
+
+    Args:
+      url:
+        The URL to retrieve
+      encoded_post_data:
+        The URL-encoded POST data. If set, POST will be used. [Optional]
+      use_gzip:
+        If True, tells the server to gzip-compress the response.
+        It does not apply to POST requests. [Optional]
+
+    Returns:
+      A string containing the body of the response.
+    '''
+    http_proxy = os.environ.get('http_proxy')
+    https_proxy = os.environ.get('https_proxy')
+
+    if http_proxy is None or  https_proxy is None :
+      proxy_status = False
+    else :
+      proxy_status = True
+
+    if self._connection_pool is not None and proxy_status is False:
+      headers = dict(self._request_headers)
+      if use_gzip and not encoded_post_data:
+        headers['Accept-Encoding'] = 'gzip'
+
+      if encoded_post_data:
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        response = self._connection_pool.Request('POST', url, encoded_post_data, headers)
+      else:
+        response = self._connection_pool.Request('GET', url, None, headers)
+
+      self._NotifyRateLimit(url, response.headers)
+      return self._DecompressGzippedResponse(response)
+
+    if self._debugHTTP:
+      _debug = 1
+    else:
+      _debug = 0
+
+    http_handler  = self._urllib.HTTPHandler(debuglevel=_debug)
+    https_handler = self._urllib.HTTPSHandler(debuglevel=_debug)
+
+    opener = self._urllib.OpenerDirector()
+    opener.add_handler(http_handler)
+    opener.add_handler(https_handler)
+
+    if proxy_status is True :
+      proxy_handler = self._urllib.ProxyHandler({'http':str(http_proxy),'https': str(https_proxy)})
+      opener.add_handler(proxy_handler)
+
+    # Set up compression
+    if use_gzip and not encoded_post_data:
+      opener.addheaders.append(('Accept-Encoding', 'gzip'))
+
+    response = opener.open(url, encoded_post_data)
+    self._NotifyRateLimit(url, response.headers)
+    url_data = self._DecompressGzippedResponse(response)
+    opener.close()
+    return url_data
+
+  def _NotifyRateLimit(self, url, headers):
+    '''Call the rate limit listener with the x-rate-limit headers of a response, if it has them.'''
+    if self._rate_limit_listener is None:
+      return
+
+    remaining = headers.get('x-rate-limit-remaining', None)
+    reset = headers.get('x-rate-limit-reset', None)
+
+    if remaining is not None and reset is not None:
+      self._rate_limit_listener(url, int(remaining), int(reset))
+
+
+class _PooledResponse(object):
+  '''The status, headers and body of a response read from a kept-alive connection'''
+
+  def __init__(self, status, headers, data):
+    self.status = status
+    self.headers = headers
+    self._data = data
+
+  def read(self):
+    return self._data
+
+
+class _ConnectionPool(object):
+  '''A thread-safe pool of persistent HTTP and HTTPS connections.
+
+  Idle connections are kept alive per (scheme, host) and reused by the next
+  request to the same host, saving the TCP and TLS handshakes. The pool also
+  counts the requests and their latency.
+  '''
+
+  MAX_IDLE_PER_HOST = 8
+
+  def __init__(self, timeout=None, ssl_context=None, debuglevel=0, max_idle_per_host=MAX_IDLE_PER_HOST):
+    self._timeout = timeout
+    self._ssl_context = ssl_context
+    self._debuglevel = debuglevel
+    self._max_idle_per_host = max_idle_per_host
+    self._idle = {}
+    self._lock = threading.Lock()
+
+    self._requests = 0
+    self._new_connections = 0
+    self._errors = 0
+    self._total_latency = 0.0
+    self._max_latency = 0.0
+
+  def Request(self, method, url, body=None, headers=None):
+    '''Send a request on a kept-alive connection to the host of the URL.
+
+    A request that fails on a reused connection (e.g. closed by the
+    server while idle) is retried once on a new connection.
+
+    Args:
+      method:
+        The HTTP method
+      url:
+        The URL to request
+      body:
+        The encoded request body [Optional]
+      headers:
+        A dictionary of request headers [Optional]
+
+    Returns:
+      A _PooledResponse with the status, headers and body of the response.
+
+    Raises:
+      urllib2.URLError if the request failed.
+    '''
+    (scheme, netloc, path, params, query, fragment) = urlparse.urlparse(url)
+    selector = urlparse.urlunparse(('', '', path or '/', params, query, ''))
+    host = (scheme, netloc)
+
+    start = time.time()
+    allow_reuse = True
+
+    while True:
+      connection, reused = self._Acquire(host, allow_reuse)
+
+      try:
+        connection.request(method, selector, body, headers or {})
+        response = connection.getresponse()
+        data = response.read()
+        break
+
+      except (httplib.HTTPException, socket.error) as e:
+        connection.close()
+
+        if not reused:
+          self._Record(time.time() - start, new_connection=True, error=True)
+          raise urllib2.URLError(e)
+
+        allow_reuse = False
+
+    if response.will_close:
+      connection.close()
+    else:
+      self._Release(host, connection)
+
+    self._Record(time.time() - start, new_connection=not reused)
+    return _PooledResponse(response.status, response.msg, data)
+
+  def GetStats(self):
+    '''Returns the request counters.
+
+    Returns:
+      A dictionary with the number of requests, the number of new and
+      reused connections, the number of failed requests, and the total,
+      average and maximal latency in seconds.
+    '''
+    with self._lock:
+      return {'requests': self._requests,
+              'new_connections': self._new_connections,
+              'reused_connections': self._requests - self._new_connections,
+              'errors': self._errors,
+              'total_latency': self._total_latency,
+              'average_latency': self._total_latency / self._requests if self._requests else 0.0,
+              'max_latency': self._max_latency}
+
+  def Close(self):
+    '''Close all the idle connections.'''
+    with self._lock:
+      idle, self._idle = self._idle, {}
+
+    for connections in idle.values():
+      for connection in connections:
+        connection.close()
+
+  def _Acquire(self, host, allow_reuse=True):
+    '''Returns an idle connection to the host, or a new one, and whether it was reused.'''
+    if allow_reuse:
+      with self._lock:
+        connections = self._idle.get(host)
+        if connections:
+          return connections.pop(), True
+
+    scheme, netloc = host
+    if scheme == 'https':
+      if self._ssl_context is not None:
+        connection = httplib.HTTPSConnection(netloc, timeout=self._timeout, context=self._ssl_context)
+      else:
+        connection = httplib.HTTPSConnection(netloc, timeout=self._timeout)
+    else:
+      connection = httplib.HTTPConnection(netloc, timeout=self._timeout)
+
+    connection.set_debuglevel(self._debuglevel)
+    return connection, False
+
+  def _Release(self, host, connection):
+    '''Return a connection to the idle connections of the host, or close it if there are enough.'''
+    with self._lock:
+      connections = self._idle.setdefault(host, [])
+      if len(connections) < self._max_idle_per_host:
+        connections.append(connection)
+        return
+
+    connection.close()
+
+  def _Record(self, latency, new_connection, error=False):
+    with self._lock:
+      self._requests += 1
+      self._new_connections += new_connection
+      self._errors += error
+      self._total_latency += latency
+      self._max_latency = max(self._max_latency, latency)
+
+
+class _CacheStats(object):
+  '''The counters shared by MemoryCache and SqliteCache. A lookup is a
+  call to GetCachedTime, and a hit is a call to Get that finds the data,
+  so the responses that are cached but outdated for the Api are misses.'''
+
+  def __init__(self):
+    self._stats_lock = threading.Lock()
+    self._lookups = 0
+    self._hits = 0
+    self._sets = 0
+    self._evictions = 0
+    self._expirations = 0
+
+  def _Count(self, lookups=0, hits=0, sets=0, evictions=0, expirations=0):
+    with self._stats_lock:
+      self._lookups += lookups
+      self._hits += hits
+      self._sets += sets
+      self._evictions += evictions
+      self._expirations += expirations
+
+  def GetStats(self):
+    '''Returns the hit and miss counters of the cache.
+
+    Returns:
+      A dictionary with the number of lookups, hits, misses, stored,
+      evicted and expired responses, and the number of cached responses.
+    '''
+    size = len(self)
+    with self._stats_lock:
+      return {'lookups': self._lookups,
+              'hits': self._hits,
+              'misses': self._lookups - self._hits,
+              'sets': self._sets,
+              'evictions': self._evictions,
+              'expirations': self._expirations,
+              'size': size}
+
+
+class MemoryCache(_CacheStats):
+  '''An in-memory cache of responses, shared by the threads of the Api.
+
+  It keeps up to max_size responses, evicting the least recently used
+  one, and drops the responses older than ttl seconds.
+  '''
+
+  def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=None):
+    '''Instantiate a new MemoryCache.
+
+    Args:
+      max_size:
+        The maximal number of cached responses. [Optional]
+      ttl:
+        The time, in seconds, to keep a response. Defaults to None,
+        keeping it until it is evicted. [Optional]
+    '''
+    _CacheStats.__init__(self)
+    self._max_size = max_size
+    self._ttl = ttl
+    self._lock = threading.Lock()
+    self._entries = OrderedDict()
+
+  def Get(self, key):
+    with self._lock:
+      entry = self._GetEntry(key)
+      if entry is None:
+        return None
+
+      # Move it to the end, as the most recently used
+      del self._entries[key]
+      self._entries[key] = entry
+
+    self._Count(hits=1)
+    return entry[1]
+
+  def Set(self, key, data):
+    evictions = 0
+    with self._lock:
+      self._entries.pop(key, None)
+      self._entries[key] = (time.time(), data)
+
+      while len(self._entries) > self._max_size:
+        self._entries.popitem(last=False)
+        evictions += 1
+
+    self._Count(sets=1, evictions=evictions)
+
+  def Remove(self, key):
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def GetCachedTime(self, key):
+    self._Count(lookups=1)
+    with self._lock:
+      entry = self._GetEntry(key)
+      return entry[0] if entry is not None else None
+
+  def __len__(self):
+    return len(self._entries)
+
+  def _GetEntry(self, key):
+    '''Returns the (cached time, data) of a key which didn't expire,
+    removing it if it did. Called with the lock held.'''
+    entry = self._entries.get(key)
+    if entry is not None and self._ttl is not None and \
+       time.time() >= entry[0] + self._ttl:
+      del self._entries[key]
+      self._Count(expirations=1)
+      return None
+    return entry
+
+
+class SqliteCache(_CacheStats):
+  '''A cache of responses in a single SQLite file, shared by the threads
+  of the Api and kept between runs.
+
+  It keeps up to max_size responses, evicting the least recently stored
+  ones, and drops the responses older than ttl seconds.
+  '''
+
+  def __init__(self, path=DEFAULT_CACHE_FILE, max_size=None, ttl=None):
+    '''Instantiate a new SqliteCache.
+
+    Args:
+      path:
+        The database file. Defaults to DEFAULT_CACHE_FILE in the current
+        directory. [Optional]
+      max_size:
+        The maximal number of cached responses. Defaults to None, without
+        a limit. [Optional]
+      ttl:
+        The time, in seconds, to keep a response. Defaults to None,
+        keeping it until it is evicted. [Optional]
+    '''
+    _CacheStats.__init__(self)
+    self._max_size = max_size
+    self._ttl = ttl
+    self._lock = threading.Lock()
+    self._connection = sqlite3.connect(path, check_same_thread=False)
+    self._connection.text_factory = str
+    with self._connection:
+      self._connection.execute('CREATE TABLE IF NOT EXISTS responses '
+                               '(key TEXT PRIMARY KEY, data BLOB, cached_time REAL)')
+      self._connection.execute('CREATE INDEX IF NOT EXISTS responses_cached_time '
+                               'ON responses (cached_time)')
+
+  def Get(self, key):
+    with self._lock:
+      row = self._GetRow(key)
+    if row is None:
+      return None
+    self._Count(hits=1)
+    return str(row[1])
+
+  def Set(self, key, data):
+    evictions = 0
+    with self._lock:
+      with self._connection:
+        self._connection.execute('INSERT OR REPLACE INTO responses (key, data, cached_time) '
+                                 'VALUES (?, ?, ?)', (key, sqlite3.Binary(data), time.time()))
+
+        if self._max_size is not None:
+          evictions = self._connection.execute(
+            'DELETE FROM responses WHERE key IN (SELECT key FROM responses '
+            'ORDER BY cached_time DESC LIMIT -1 OFFSET ?)', (self._max_size,)).rowcount
+
+    self._Count(sets=1, evictions=evictions)
+
+  def Remove(self, key):
+    with self._lock:
+      with self._connection:
+        self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+
+  def GetCachedTime(self, key):
+    self._Count(lookups=1)
+    with self._lock:
+      row = self._GetRow(key)
+    return row[0] if row is not None else None
+
+  def Close(self):
+    '''Close the database file.'''
+    with self._lock:
+      self._connection.close()
+
+  def __len__(self):
+    with self._lock:
+      return self._connection.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+  def _GetRow(self, key):
+    '''Returns the (cached time, data) of a key which didn't expire,
+    removing it if it did. Called with the lock held.'''
+    row = self._connection.execute('SELECT cached_time, data FROM responses WHERE key = ?',
+                                   (key,)).fetchone()
+    if row is not None and self._ttl is not None and time.time() >= row[0] + self._ttl:
+      with self._connection:
+        self._connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+      self._Count(expirations=1)
+      return None
+    return row
+
+
 class _FileCacheError(Exception):
   '''Base exception class for FileCache related errors'''
 
@@ -0,0 +1,148 @@
+import sys
+import time
+import codecs
+import itertools
+
+sys.path.append('../')
+
+from docopt import docopt
+from fuzzywuzzy import fuzz
+from common.lru_cache import LRUCache
+
+import get_corefering_predicates
+
+from get_corefering_predicates import load_propositions, get_candidate_pairs, get_features, align_candidates, \
+    is_eq_preds, is_aligned_arg_synonyms, get_synonyms, expand_numbers, nlp, CANDIDATES_BATCH_SIZE, \
+    SYNONYMS_CACHE_SIZE, EXPANDED_ARGS_CACHE_SIZE
+
+
+def main():
+    """
+    Micro-benchmark of the per-candidate alignment cost: the pairwise rules applied to the raw propositions,
+    vs. the pairwise rules applied to the per-proposition feature records.
+    """
+    args = docopt("""Micro-benchmark of the per-candidate alignment cost: the pairwise rules applied to the raw
+    propositions, vs. the pairwise rules applied to the per-proposition feature records.
+
+    Usage:
+        benchmark_alignment.py [--max_candidates=<max_candidates>] <tweets_file>
+
+        <tweets_file> = the propositions file, as produced by prop_extraction.
+        <max_candidates> = (optional) the number of candidate pairs to align (default: 100000).
+    """)
+
+    max_candidates = int(args['--max_candidates']) if args['--max_candidates'] else 100000
+
+    with codecs.open('pronouns.txt', 'r', 'utf-8') as f_in:
+        pronouns = set([line.strip() for line in f_in])
+
+    propositions, candidates = get_candidate_pairs(load_propositions(args['<tweets_file>']), pronouns)
+    candidates = list(itertools.islice(candidates, max_candidates))
+
+    if len(candidates) == 0:
+        print 'No candidates'
+        return
+
+    # Load WordNet before the timing
+    get_synonyms('news')
+
+    # Before: compute everything for each candidate pair, without the synonyms and expanded arguments caches
+    start = time.time()
+    before = align_candidates_pairwise([propositions[i] + propositions[j] for i, j in candidates])
+    before_time = time.time() - start
+
+    # After: compute the features of each proposition once, and apply the rules on them, starting with empty caches
+    get_corefering_predicates.synonyms = LRUCache(get_synonyms, SYNONYMS_CACHE_SIZE)
+    get_corefering_predicates.expanded_args = LRUCache(expand_numbers, EXPANDED_ARGS_CACHE_SIZE)
+    start = time.time()
+    features = get_features(propositions)
+    after = []
+    for k in range(0, len(candidates), CANDIDATES_BATCH_SIZE):
+        after.extend(align_candidates(candidates[k:k + CANDIDATES_BATCH_SIZE], propositions, features))
+    after_time = time.time() - start
+
+    print 'Aligned %d candidates, %d alignments (same alignments: %s)' % \
+          (len(candidates), len(after), set(before) == set(after))
+    print 'Before: %.2f microseconds per candidate' % (before_time * 1e6 / len(candidates))
+    print 'After: %.2f microseconds per candidate (including the features)' % (after_time * 1e6 / len(candidates))
+
+
+def align_candidates_pairwise(candidates):
+    """
+    Align the predicates of candidate pairs of propositions, one pair at a time, without precomputed features
+    or cached synonyms and expanded arguments
+    :param candidates: a list of candidate pairs, each a concatenation of two (tweet_id, sent, sf_pred, pred, a0, a1)
+    :return: a list of aligned_prop
+    """
+    predicate_alignments = []
+
+    for (tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1, tweet_id2, sent2, sf_pred2, pred2, s1_a0, s1_a1) in candidates:
+
+        if fuzz.token_sort_ratio(sent1, sent2) >= 95 or is_eq_preds(pred1, pred2):
+            continue
+
+        is_eq_a0_a0, is_eq_a1_a1, is_eq_a0_a1, is_eq_a1_a0 = \
+            uncached_is_eq_arg(s0_a0, s1_a0), uncached_is_eq_arg(s0_a1, s1_a1), \
+            uncached_is_eq_arg(s0_a0, s1_a1), uncached_is_eq_arg(s0_a1, s1_a0)
+
+        is_aligned_a0_a0 = is_eq_a0_a0 or uncached_is_aligned_arg(s0_a0, s1_a0)
+        is_aligned_a1_a1 = is_eq_a1_a1 or uncached_is_aligned_arg(s0_a1, s1_a1)
+        is_aligned_a0_a1 = is_eq_a0_a1 or uncached_is_aligned_arg(s0_a0, s1_a1)
+        is_aligned_a1_a0 = is_eq_a1_a0 or uncached_is_aligned_arg(s0_a1, s1_a0)
+
+        is_aligned_pred = uncached_is_aligned_preds(pred1, pred2)
+
+        if (is_eq_a0_a0 and is_aligned_a1_a1) or (is_aligned_a0_a0 and is_eq_a1_a1) or \
+                (is_aligned_pred and is_aligned_a0_a0 and is_aligned_a1_a1):
+            predicate_alignments.append((tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
+                                         tweet_id2, sent2, sf_pred2, pred2, s1_a0, s1_a1))
+
+        elif (is_eq_a0_a1 and is_aligned_a1_a0) or (is_aligned_a0_a1 and is_eq_a1_a0) or \
+                (is_aligned_pred and is_aligned_a0_a1 and is_aligned_a1_a0):
+            new_pred2 = pred2.replace('{a0}', 'ARG0').replace('{a1}', '{a0}').replace('ARG0', '{a1}')
+            new_sf_pred2 = sf_pred2.replace('{a0}', 'ARG0').replace('{a1}', '{a0}').replace('ARG0', '{a1}')
+            predicate_alignments.append((tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
+                                         tweet_id2, sent2, new_sf_pred2, new_pred2, s1_a1, s1_a0))
+
+    return predicate_alignments
+
+
+def uncached_is_eq_arg(x, y):
+    """
+    Return whether these two words are equal, with fuzzy string matching or with the numbers converted to words,
+    converting the numbers for each call
+    :param x: the first argument
+    :param y: the second argument
+    :return: Whether they are equal
+    """
+    return fuzz.ratio(x, y) >= 90 or fuzz.ratio(expand_numbers(x), expand_numbers(y)) >= 85
+
+
+def uncached_is_aligned_preds(x, y):
+    """
+    Return whether these two words are aligned: they occur in the same WordNet synset, looking up the WordNet
+    synonyms for each call
+    :param x: the first argument
+    :param y: the second argument
+    :return: Whether they are aligned
+    """
+    return len(get_synonyms(x).intersection(get_synonyms(y))) > 0
+
+
+def uncached_is_aligned_arg(x, y):
+    """
+    Return whether these two arguments are aligned: they match partially, or their words occur in the same WordNet
+    synsets, looking up the WordNet synonyms for each call
+    :param x: the first argument
+    :param y: the second argument
+    :return: Whether they are aligned
+    """
+    if fuzz.partial_ratio(' ' + x + ' ', ' ' + y + ' ') == 100:
+        return True
+
+    return is_aligned_arg_synonyms([get_synonyms(w) for w in x.split() if not nlp.is_stop(w)],
+                                   [get_synonyms(w) for w in y.split() if not nlp.is_stop(w)])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,33 @@
+import sys
+import time
 import codecs
+import itertools
 
+sys.path.append('../')
+
+from array import array
 from docopt import docopt
-from fuzzywuzzy import fuzz
+from multiprocessing import Pool
+from fuzzywuzzy import fuzz, utils
 from spacy.en import English
 from num2words import num2words
 from collections import defaultdict
 from nltk.corpus import wordnet as wn
 from guess_language import guessLanguage
+from common.lru_cache import LRUCache
 
 nlp = English()
 
 MAX_PRED_FOR_ARG_PAIR = 5
+SYNONYMS_CACHE_SIZE = 100000
+EXPANDED_ARGS_CACHE_SIZE = 100000
+CANDIDATES_BATCH_SIZE = 10000
+
+# The fast language pre-check: sentences with more non-ASCII letters are not English, and ASCII sentences
+# with at least this many tokens and this ratio of English stop words are English
+MAX_NON_ASCII_RATIO = 0.5
+MIN_TOKENS_FOR_STOP_WORD_RATIO = 5
+MIN_STOP_WORD_RATIO = 0.3
 
 
 def main():
@@ -24,54 +41,70 @@ def main():
     items for the proposition.
 
     Usage:
-        get_corefering_predicates.py <tweets_file> <out_file>
+        get_corefering_predicates.py [--max_posting_list=<max_posting_list>] [--max_df=<max_df>]
+                                     [--synonyms_cache=<synonyms_cache>] [--expanded_args_cache=<expanded_args_cache>]
+                                     [--workers=<workers>] [--fast_language_filter]
+                                     <tweets_file> <out_file>
 
         <tweets_file> = the file containing the propositions from tweets discussing
         the same event, each line in the format: confidence\tpredicate\targ1\targ2\ttweet
         <out_file> = the output file, that will contain the positive instances.
+        <max_posting_list> = (optional) argument words that occur in more propositions are not used to
+        generate candidate pairs.
+        <max_df> = (optional) argument words that occur in a larger ratio of the propositions are not used to
+        generate candidate pairs.
+        <synonyms_cache> = (optional) a file to persist the WordNet synonyms of words in, across runs.
+        <expanded_args_cache> = (optional) a file to persist the arguments with numbers converted to words in,
+        across runs.
+        <workers> = (optional) the number of processes to align the candidate pairs in (default: 1).
+        --fast_language_filter = (optional) identify obviously English / non English sentences by their
+        characters and stop words, and use guessLanguage only for the other sentences.
     """)
 
+    start_time = time.time()
+
     tweets_file = args['<tweets_file>']
     out_file = args['<out_file>']
+    max_posting_list = int(args['--max_posting_list']) if args['--max_posting_list'] else None
+    max_df = float(args['--max_df']) if args['--max_df'] else None
+    workers = int(args['--workers']) if args['--workers'] else 1
+
+    global synonyms, expanded_args
+    synonyms = LRUCache(get_synonyms, SYNONYMS_CACHE_SIZE, args['--synonyms_cache'])
+    expanded_args = LRUCache(expand_numbers, EXPANDED_ARGS_CACHE_SIZE, args['--expanded_args_cache'])
 
     # Load a list of pronouns
     with codecs.open('pronouns.txt', 'r', 'utf-8') as f_in:
         pronouns = set([line.strip() for line in f_in])
 
     # Load the propositions file
-    with codecs.open(tweets_file, 'r', 'utf-8', errors='replace') as f_in:
-        propositions = [tuple(line.lower().strip().split('\t')) for line in f_in]
-
-        # Unite consecutive arguments, e.g. "US government"
-        for i, prop in enumerate(propositions):
-            if len(prop) >= 9:
-                tweet_id, sent, sf_pred, lemmatized_pred, _, a0, _, a1, _, a2 = prop[:10]
-                if '{a0} {a1}' in lemmatized_pred:
-                    sf_pred = sf_pred.replace('{a0} {a1}', '{a0}').replace('{a2}', '{a1}')
-                    lemmatized_pred = lemmatized_pred.replace('{a0} {a1}', '{a0}').replace('{a2}', '{a1}')
-                    a0 = a0 + ' ' + a1
-                    a1 = a2
-                    propositions[i] = (tweet_id, sent, sf_pred, lemmatized_pred, 'a0', a0, 'a1', a1)
-                elif '{a1} {a2}' in lemmatized_pred:
-                    sf_pred = sf_pred.replace('{a1} {a2}', '{a1}')
-                    lemmatized_pred = lemmatized_pred.replace('{a1} {a2}', '{a1}')
-                    a1 = a1 + ' ' + a2
-                    propositions[i] = (tweet_id, sent, sf_pred, lemmatized_pred, 'a0', a0, 'a1', a1)
-
-        # 0 - tweet_id, 1 - sentence, 2 - predicate, 3 - lemmatized predicate, 4 - "A0", 5 - A0, 6 - "A1", 7 - A1
-        propositions = [(item[0], item[1], item[2][:item[2].index('{a1}') + 4].strip(),
-                         item[3][:item[3].index('{a1}') + 4].strip(), item[5], item[7])
-                        for item in propositions if len(item) >= 8 and '{a1}' in item[2]]
-
-        # Remove non English sentences, those with short arguments and trivial / too general predicates
-        propositions = [(tweet_id, sent, surface_pred, pred, a0, a1) for (tweet_id, sent, surface_pred, pred, a0, a1)
-                        in propositions if guessLanguage(sent) == 'en' and len(a0) >= 2 and len(a1) >= 2
-                        and pred not in ['{a0} {a1}', '{a1} {a0}', '{a0} be {a1}', '{a0} be {a1}']]
+    language_filter = LanguageFilter(args['--fast_language_filter'])
+    propositions = load_propositions(tweets_file, language_filter)
 
     # Find predicates that match by argument
-    predicate_alignments = pair_aligned_propositions(propositions, pronouns)
+    predicate_alignments = pair_aligned_propositions(propositions, pronouns, max_posting_list, max_df, workers)
+    print 'WordNet synonyms cache: %s' % synonyms.stats()
+    print 'Expanded arguments cache: %s' % expanded_args.stats()
+    synonyms.close()
+    expanded_args.close()
+
+    filtered = filter_instances(predicate_alignments)
+    print 'Extracted %d instances' % len(filtered)
+
+    # Write the predicate alignments to the output file
+    write_instances(filtered, tweets_file, out_file)
+
+    total_time = time.time() - start_time
+    print 'Language identification: %s (%.2f%% of the total time)' % \
+          (language_filter.stats(), 100.0 * language_filter.time / total_time if total_time > 0 else 0.0)
 
-    # Keep one tweet id pair and one (s,v,o) tuple for each instance
+
+def filter_instances(predicate_alignments):
+    """
+    Keep one tweet id pair and one (s,v,o) tuple for each instance
+    :param predicate_alignments: the list of aligned_prop
+    :return: the instances
+    """
     filtered = {tuple(sorted([tweet_id1, tweet_id2])):
                     (tweet_id1, sent1, sf_pred1, pred1, sent1_a0, sent1_a1,
                      tweet_id2, sent2, sf_pred2, pred2, sent2_a0, sent2_a1)
@@ -86,28 +119,180 @@ def main():
                      tweet_id2, sent2, sf_pred2, pred2, sent2_a0, sent2_a1)
                 in filtered}.values()
 
-    print 'Extracted %d instances' % len(filtered)
+    return filtered
 
-    # Write the predicate alignments to the output file
+
+def write_instances(filtered, tweets_file, out_file):
+    """
+    Write the instances to the output file, each with the date of the propositions file
+    :param filtered: the instances
+    :param tweets_file: the propositions file
+    :param out_file: the output file (without the .prop suffix). It is not created if there are no instances.
+    :return: the lines written
+    """
     out_file = out_file.replace('.prop', '')
+    lines = []
 
     if len(filtered) > 0:
         with codecs.open(out_file, 'w', 'utf-8') as f_out:
             for prop_pair in filtered:
                 try:
                     date = tweets_file[tweets_file.index('/') + 1 if '/' in tweets_file else 0:]
-                    print >> f_out, date + '\t' + '\t'.join(prop_pair)
+                    line = date + '\t' + '\t'.join(prop_pair)
+                    print >> f_out, line
+                    lines.append(line)
                 except:
                     print 'error'
 
+    return lines
+
 
-def get_candidate_pairs(propositions, pronouns):
+def load_propositions(tweets_file, language_filter=None):
+    """
+    Load the propositions file
+    :param tweets_file: the propositions file, as produced by prop_extraction
+    :param language_filter: the LanguageFilter to identify English sentences with (None for a new one)
+    :return: the English (tweet_id, sent, sf_pred, pred, a0, a1) tuples with a0 and a1 arguments
+    """
+    language_filter = language_filter or LanguageFilter()
+
+    with codecs.open(tweets_file, 'r', 'utf-8', errors='replace') as f_in:
+        propositions = [parse_proposition(line, language_filter) for line in f_in]
+
+    return [prop for prop in propositions if prop is not None]
 
+
+def parse_proposition(line, language_filter):
+    """
+    Parse a line of the propositions file
+    :param line: the line, as produced by prop_extraction
+    :param language_filter: the LanguageFilter to identify English sentences with
+    :return: the (tweet_id, sent, sf_pred, pred, a0, a1) tuple, or None if the proposition is not English,
+    doesn't have a0 and a1 arguments, or is filtered
+    """
+    prop = tuple(line.lower().strip().split('\t'))
+
+    # Unite consecutive arguments, e.g. "US government"
+    if len(prop) >= 9:
+        tweet_id, sent, sf_pred, lemmatized_pred, _, a0, _, a1, _, a2 = prop[:10]
+        if '{a0} {a1}' in lemmatized_pred:
+            sf_pred = sf_pred.replace('{a0} {a1}', '{a0}').replace('{a2}', '{a1}')
+            lemmatized_pred = lemmatized_pred.replace('{a0} {a1}', '{a0}').replace('{a2}', '{a1}')
+            a0 = a0 + ' ' + a1
+            a1 = a2
+            prop = (tweet_id, sent, sf_pred, lemmatized_pred, 'a0', a0, 'a1', a1)
+        elif '{a1} {a2}' in lemmatized_pred:
+            sf_pred = sf_pred.replace('{a1} {a2}', '{a1}')
+            lemmatized_pred = lemmatized_pred.replace('{a1} {a2}', '{a1}')
+            a1 = a1 + ' ' + a2
+            prop = (tweet_id, sent, sf_pred, lemmatized_pred, 'a0', a0, 'a1', a1)
+
+    # 0 - tweet_id, 1 - sentence, 2 - predicate, 3 - lemmatized predicate, 4 - "A0", 5 - A0, 6 - "A1", 7 - A1
+    if len(prop) < 8 or '{a1}' not in prop[2]:
+        return None
+
+    tweet_id, sent, surface_pred, pred, a0, a1 = (prop[0], prop[1], prop[2][:prop[2].index('{a1}') + 4].strip(),
+                                                  prop[3][:prop[3].index('{a1}') + 4].strip(), prop[5], prop[7])
+
+    # Remove non English sentences, those with short arguments and trivial / too general predicates
+    if len(a0) >= 2 and len(a1) >= 2 and pred not in ['{a0} {a1}', '{a1} {a0}', '{a0} be {a1}', '{a0} be {a1}'] \
+            and language_filter.is_english(sent):
+        return tweet_id, sent, surface_pred, pred, a0, a1
+
+    return None
+
+
+class LanguageFilter(object):
+    """
+    Identifies English sentences with guessLanguage, once per sentence (a tweet has several propositions
+    with the same sentence). Optionally, obviously English / non English sentences are identified by a cheap
+    pre-check of their characters and stop words, without guessLanguage.
+    """
+    def __init__(self, fast_filter=False):
+        """
+        Initialize the filter
+        :param fast_filter: whether to use the cheap pre-check
+        """
+        self.fast_filter = fast_filter
+        self.is_english_by_sent = {}
+        self.time = 0.0
+        self.cache_hits = self.guess_language_calls = self.fast_english = self.fast_non_english = 0
+
+    def is_english(self, sent):
+        """
+        Returns whether the sentence is in English
+        :param sent: the sentence
+        :return: whether the sentence is in English
+        """
+        if sent in self.is_english_by_sent:
+            self.cache_hits += 1
+            return self.is_english_by_sent[sent]
+
+        start = time.time()
+        is_english = self.fast_check(sent) if self.fast_filter else None
+
+        if is_english is None:
+            self.guess_language_calls += 1
+            is_english = guessLanguage(sent) == 'en'
+
+        self.is_english_by_sent[sent] = is_english
+        self.time += time.time() - start
+        return is_english
+
+    def fast_check(self, sent):
+        """
+        Identify obviously English / non English sentences
+        :param sent: the sentence
+        :return: True for English, False for non English, and None if it is not obvious
+        """
+        global nlp
+
+        letters = [c for c in sent if c.isalpha()]
+        if len(letters) == 0:
+            return None
+
+        # Mostly non-latin script
+        if len([c for c in letters if ord(c) >= 128]) > MAX_NON_ASCII_RATIO * len(letters):
+            self.fast_non_english += 1
+            return False
+
+        # ASCII with many English stop words
+        tokens = sent.split()
+        if len(letters) == len([c for c in letters if ord(c) < 128]) and len(tokens) >= MIN_TOKENS_FOR_STOP_WORD_RATIO \
+                and len([t for t in tokens if nlp.is_stop(t)]) >= MIN_STOP_WORD_RATIO * len(tokens):
+            self.fast_english += 1
+            return True
+
+        return None
+
+    def stats(self):
+        """
+        Returns a textual summary of the language identification
+        :return: a textual summary of the language identification
+        """
+        return '%d sentences (%d cached), %d identified by guessLanguage, %d as English and %d as non English ' \
+               'by the pre-check, in %.2f seconds' % \
+               (len(self.is_english_by_sent) + self.cache_hits, self.cache_hits, self.guess_language_calls,
+                self.fast_english, self.fast_non_english, self.time)
+
+
+def get_candidate_pairs(propositions, pronouns, max_posting_list=None, max_df=None):
+    """
+    Get the candidate pairs of propositions: propositions that share a (non stop word) argument word.
+    The pairs are generated lazily from the inverted index of argument words, without materializing all of them.
+    :param propositions: the (tweet_id, sent, sf_pred, pred, a0, a1) tuples
+    :param pronouns: a set of pronouns, propositions with a pronoun argument are removed
+    :param max_posting_list: argument words that occur in more propositions are ignored (None for no limit)
+    :param max_df: argument words that occur in a larger ratio of the propositions are ignored (None for no limit)
+    :return: the filtered propositions and a generator of (i, j) indices of candidate pairs in them,
+    where each unordered pair is generated once, with i < j
+    """
     global nlp
 
-    # Remove propositions with argument pronouns
-    propositions = [(tweet_id, sent, sf_pred, pred, a0, a1) for (tweet_id, sent, sf_pred, pred, a0, a1) in propositions
-                    if len(pronouns.intersection(set([a0, a1]))) == 0 and len(sent) > 10]
+    # Remove propositions with argument pronouns and duplicate propositions
+    propositions = sorted(set([(tweet_id, sent, sf_pred, pred, a0, a1)
+                               for (tweet_id, sent, sf_pred, pred, a0, a1) in propositions
+                               if len(pronouns.intersection(set([a0, a1]))) == 0 and len(sent) > 10]))
 
     print 'Extracted %d propositions' % len(propositions)
 
@@ -120,95 +305,443 @@ def get_candidate_pairs(propositions, pronouns):
     [candidates_by_args[w].add(i) for i, (tweet_id, sent, sf_pred, pred, a0, a1) in enumerate(propositions)
      for w in a1.split() if not nlp.is_stop(w)]
 
-    # Get pairwise candidates from all lists
-    candidates = set([propositions[i] + propositions[j] for lst in candidates_by_args.values()
-                      for i in lst for j in lst if i != j])
+    # Remove too frequent argument words, and report the number of pairs in their posting lists
+    pruned_by_df, pruned_by_size = [0, 0], [0, 0]
+
+    for w, lst in candidates_by_args.items():
+        num_pairs = len(lst) * (len(lst) - 1) / 2
+
+        if max_df is not None and len(lst) > max_df * len(propositions):
+            pruned = pruned_by_df
+        elif max_posting_list is not None and len(lst) > max_posting_list:
+            pruned = pruned_by_size
+        else:
+            continue
 
-    print 'Extracted %d candidates' % len(candidates)
+        pruned[0] += 1
+        pruned[1] += num_pairs
+        del candidates_by_args[w]
 
-    return candidates
+    if max_df is not None:
+        print 'Pruned %d argument words with document frequency > %s (%d pairs in their posting lists)' % \
+              (pruned_by_df[0], max_df, pruned_by_df[1])
 
+    if max_posting_list is not None:
+        print 'Pruned %d argument words with posting list size > %d (%d pairs in their posting lists)' % \
+              (pruned_by_size[0], max_posting_list, pruned_by_size[1])
 
-def pair_aligned_propositions(propositions, pronouns):
+    words_by_prop = [set([w for w in a0.split() + a1.split() if w in candidates_by_args])
+                     for (tweet_id, sent, sf_pred, pred, a0, a1) in propositions]
+
+    return propositions, generate_candidate_pairs(words_by_prop, candidates_by_args)
+
+
+def generate_candidate_pairs(words_by_prop, candidates_by_args):
+    """
+    Generate the candidate pairs from the inverted index of argument words
+    :param words_by_prop: the (indexed) argument words of each proposition
+    :param candidates_by_args: the inverted index, from argument word to proposition indices
+    :return: a generator of (i, j) indices of candidate pairs, where each unordered pair is generated once, with i < j
+    """
+    for i, words in enumerate(words_by_prop):
+        neighbours = set()
+        [neighbours.update(candidates_by_args[w]) for w in words]
+
+        for j in sorted([j for j in neighbours if j > i]):
+            yield i, j
+
+
+def pair_aligned_propositions(propositions, pronouns, max_posting_list=None, max_df=None, workers=1):
     """
     Align predicates with the same arguments in different sentences
     :param propositions: the (sent, pred, arg1, arg2) tuples
+    :param pronouns: a set of pronouns, propositions with a pronoun argument are removed
+    :param max_posting_list: argument words that occur in more propositions are not used to generate candidates
+    :param max_df: argument words that occur in a larger ratio of the propositions are not used to generate candidates
+    :param workers: the number of processes to align the candidates in. The result doesn't depend on it.
     :return: a list of aligned_prop
     """
     predicate_alignments = []
+    num_candidates = 0
 
-    candidates = get_candidate_pairs(propositions, pronouns)
+    propositions, candidates = get_candidate_pairs(propositions, pronouns, max_posting_list, max_df)
 
-    for (tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1, tweet_id2, sent2, sf_pred2, pred2, s1_a0, s1_a1) in candidates:
+    # Align the candidates in batches, to score the string similarities of each batch together.
+    # Each batch is a flat array of proposition indices: i1, j1, i2, j2, ...
+    batches = iter(lambda: array('l', [k for pair in itertools.islice(candidates, CANDIDATES_BATCH_SIZE)
+                                         for k in pair]), array('l'))
 
-        # Same tweet
-        if fuzz.token_sort_ratio(sent1, sent2) >= 95:
-            continue
+    # Compute the features of each proposition once, before the workers are forked and share them
+    features = get_features(propositions)
 
-        # Same predicates?
-        if is_eq_preds(pred1, pred2):
-            continue
+    if workers > 1:
+        pool = Pool(workers, init_alignment_worker, (propositions, features, True))
 
-        # Same arguments?
-        is_eq_a0_a0, is_eq_a1_a1, is_eq_a0_a1, is_eq_a1_a0 = \
-            is_eq_arg(s0_a0, s1_a0), is_eq_arg(s0_a1, s1_a1), is_eq_arg(s0_a0, s1_a1), is_eq_arg(s0_a1, s1_a0)
+        # Send a bounded number of batches at a time, and get their results in order
+        windows = iter(lambda: list(itertools.islice(batches, workers * 2)), [])
+        batch_results = (result for window in windows for result in pool.map(align_batch, window))
 
-        # Are arguments aligned?
-        is_aligned_a0_a0 = is_eq_a0_a0 or is_aligned_arg(s0_a0, s1_a0)
-        is_aligned_a1_a1 = is_eq_a1_a1 or is_aligned_arg(s0_a1, s1_a1)
-        is_aligned_a0_a1 = is_eq_a0_a1 or is_aligned_arg(s0_a0, s1_a1)
-        is_aligned_a1_a0 = is_eq_a1_a0 or is_aligned_arg(s0_a1, s1_a0)
+    else:
+        init_alignment_worker(propositions, features)
+        batch_results = itertools.imap(align_batch, batches)
 
-        # Are predicates aligned?
-        is_aligned_pred = is_aligned_preds(pred1, pred2)
+    for batch_size, batch_alignments in batch_results:
+        num_candidates += batch_size
+        predicate_alignments.extend(batch_alignments)
+
+    if workers > 1:
+        pool.close()
+        pool.join()
+
+    print 'Extracted %d candidates' % num_candidates
+
+    return predicate_alignments
+
+
+class IncrementalAligner(object):
+    """
+    Aligns the propositions of a file while they are read, e.g. while they are extracted: the candidate pairs of each
+    new proposition with the previous ones are found in an inverted index of argument words, and aligned in batches.
+    The result is the same as pair_aligned_propositions without max_posting_list and max_df (which depend on all
+    the propositions): the same pairs are aligned, and the alignments are returned in the same order.
+    """
+    def __init__(self, pronouns):
+        """
+        Initialize an empty index
+        :param pronouns: a set of pronouns, propositions with a pronoun argument are removed
+        """
+        self.pronouns = pronouns
+        self.propositions = []
+        self.features = []
+        self.arg_features = {}
+        self.seen = set()
+        self.candidates_by_args = defaultdict(list)
+        self.candidates = []
+        self.predicate_alignments = []
+        self.num_candidates = 0
+
+    def add(self, prop):
+        """
+        Add a proposition, and align it with the previous ones once a batch of candidate pairs is ready
+        :param prop: the (tweet_id, sent, sf_pred, pred, a0, a1) tuple
+        """
+        global nlp
+
+        (tweet_id, sent, sf_pred, pred, a0, a1) = prop
+
+        # Remove propositions with argument pronouns and duplicate propositions
+        if prop in self.seen or len(self.pronouns.intersection(set([a0, a1]))) > 0 or len(sent) <= 10:
+            return
+
+        self.seen.add(prop)
+        i = len(self.propositions)
+        self.propositions.append(prop)
+
+        for arg in [a0, a1]:
+            if arg not in self.arg_features:
+                self.arg_features[arg] = ArgumentFeatures(arg)
+
+        self.features.append(PropositionFeatures(sent, pred, self.arg_features[a0], self.arg_features[a1]))
+
+        # Get candidates by lexical overlap in arguments. Each pair is ordered as in the sorted propositions.
+        words = set([w for w in a0.split() + a1.split() if not nlp.is_stop(w)])
+        neighbours = set()
+        [neighbours.update(self.candidates_by_args[w]) for w in words if w in self.candidates_by_args]
+        [self.candidates_by_args[w].append(i) for w in words]
+
+        self.candidates.extend([(j, i) if self.propositions[j] < prop else (i, j) for j in neighbours])
+
+        if len(self.candidates) >= CANDIDATES_BATCH_SIZE:
+            self.align()
+
+    def align(self):
+        """
+        Align the pending candidate pairs
+        """
+        self.num_candidates += len(self.candidates)
+        self.predicate_alignments.extend([((self.propositions[i], self.propositions[j]), aligned_prop)
+                                          for (i, j), aligned_prop in
+                                          align_candidate_pairs(self.candidates, self.propositions, self.features)])
+        self.candidates = []
+
+    def finish(self):
+        """
+        Align the remaining candidate pairs
+        :return: a list of aligned_prop, in the order of pair_aligned_propositions
+        """
+        self.align()
+
+        print 'Extracted %d propositions' % len(self.propositions)
+        print 'Extracted %d candidates' % self.num_candidates
+
+        # pair_aligned_propositions aligns the pairs (i, j), i < j, of the sorted propositions by order
+        return [aligned_prop for key, aligned_prop in sorted(self.predicate_alignments, key=lambda item: item[0])]
+
+
+class ArgumentFeatures(object):
+    """
+    The features of an argument used by the alignment rules
+    """
+    __slots__ = ['text', 'padded', 'words_synonyms', '_expanded']
+
+    def __init__(self, arg):
+        """
+        Compute the features of an argument
+        :param arg: the argument
+        """
+        self.text = arg
+        self.padded = ' ' + arg + ' '
+        self.words_synonyms = get_words_synonyms(arg)
+        self._expanded = None
+
+    @property
+    def expanded(self):
+        """
+        The argument with numbers converted to words, computed on first use: it is only compared for the argument
+        pairs whose text didn't match
+        """
+        if self._expanded is None:
+            self._expanded = expanded_args[self.text]
+
+        return self._expanded
+
+
+class PropositionFeatures(object):
+    """
+    The features of a proposition used by the alignment rules
+    """
+    __slots__ = ['sorted_sent', 'pred', 'pred_synonyms', 'a0', 'a1']
+
+    def __init__(self, sent, pred, a0, a1):
+        """
+        Compute the features of a proposition
+        :param sent: the sentence
+        :param pred: the (lemmatized) predicate
+        :param a0: the features of the first argument
+        :param a1: the features of the second argument
+        """
+        self.sorted_sent = sort_tokens(sent)
+        self.pred = pred
+        self.pred_synonyms = synonyms[pred]
+        self.a0 = a0
+        self.a1 = a1
+
+
+def get_features(propositions):
+    """
+    Compute the features of each proposition, used by the alignment rules
+    :param propositions: the (tweet_id, sent, sf_pred, pred, a0, a1) tuples
+    :return: a list of PropositionFeatures, one for each proposition
+    """
+    arg_features = {}
+
+    for (tweet_id, sent, sf_pred, pred, a0, a1) in propositions:
+        for arg in [a0, a1]:
+            if arg not in arg_features:
+                arg_features[arg] = ArgumentFeatures(arg)
+
+    return [PropositionFeatures(sent, pred, arg_features[a0], arg_features[a1])
+            for (tweet_id, sent, sf_pred, pred, a0, a1) in propositions]
+
+
+def init_alignment_worker(propositions, features, is_worker_process=False):
+    """
+    Initialize the process that aligns candidate batches
+    :param propositions: the (tweet_id, sent, sf_pred, pred, a0, a1) tuples, indexed by the candidate batches
+    :param features: the features of each proposition
+    :param is_worker_process: whether this is a worker process, forked from the main process
+    """
+    global alignment_propositions, alignment_features
+    alignment_propositions = propositions
+    alignment_features = features
+
+    # The persistent caches are only written by the main process
+    if is_worker_process:
+        synonyms.detach_persistent()
+        expanded_args.detach_persistent()
+
+
+def align_batch(batch):
+    """
+    Align a batch of candidate pairs
+    :param batch: a flat array of proposition indices of the candidate pairs: i1, j1, i2, j2, ...
+    :return: the number of candidate pairs in the batch and the list of aligned_prop
+    """
+    candidates = zip(batch[::2], batch[1::2])
+    return len(candidates), align_candidates(candidates, alignment_propositions, alignment_features)
+
+
+def align_candidates(candidates, propositions, features):
+    """
+    Align the predicates of candidate pairs of propositions
+    :param candidates: a list of (i, j) indices of candidate pairs
+    :param propositions: the (tweet_id, sent, sf_pred, pred, a0, a1) tuples
+    :param features: the features of each proposition
+    :return: a list of aligned_prop
+    """
+    return [aligned_prop for pair, aligned_prop in align_candidate_pairs(candidates, propositions, features)]
+
+
+def align_candidate_pairs(candidates, propositions, features):
+    """
+    Align the predicates of candidate pairs of propositions
+    :param candidates: a list of (i, j) indices of candidate pairs
+    :param propositions: the (tweet_id, sent, sf_pred, pred, a0, a1) tuples
+    :param features: the features of each proposition
+    :return: a list of ((i, j), aligned_prop) for the aligned candidates, in the candidates order
+    """
+    predicate_alignments = []
+
+    # Same tweet
+    is_same_tweet = batch_fuzzy_match(fuzz.ratio, [(features[i].sorted_sent, features[j].sorted_sent)
+                                                   for i, j in candidates], 95)
+    candidates = [(i, j) for (i, j), is_same in zip(candidates, is_same_tweet) if not is_same]
+
+    # Same predicates?
+    is_eq_pred = batch_is_eq_preds([(features[i].pred, features[j].pred) for i, j in candidates])
+    candidates = [(i, j) for (i, j), is_eq in zip(candidates, is_eq_pred) if not is_eq]
+
+    # Same arguments? each candidate has 4 argument pairs: a0-a0, a1-a1, a0-a1, a1-a0
+    arg_pairs = [arg_pair for i, j in candidates
+                 for arg_pair in [(features[i].a0, features[j].a0), (features[i].a1, features[j].a1),
+                                  (features[i].a0, features[j].a1), (features[i].a1, features[j].a0)]]
+    is_eq_args = batch_is_eq_args(arg_pairs)
+
+    # Are arguments aligned?
+    is_aligned_args = batch_is_aligned_args(arg_pairs, is_eq_args)
+
+    for k, (i, j) in enumerate(candidates):
+        (tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1, tweet_id2, sent2, sf_pred2, pred2, s1_a0, s1_a1) = \
+            propositions[i] + propositions[j]
+
+        is_eq_a0_a0, is_eq_a1_a1, is_eq_a0_a1, is_eq_a1_a0 = is_eq_args[4 * k:4 * k + 4]
+        is_aligned_a0_a0, is_aligned_a1_a1, is_aligned_a0_a1, is_aligned_a1_a0 = is_aligned_args[4 * k:4 * k + 4]
 
         # 1) the predicates are not equal, one argument-pair is aligned/equal, the other argument-pair is equal =>
         # predicates are aligned
         if (is_eq_a0_a0 and is_aligned_a1_a1) or (is_aligned_a0_a0 and is_eq_a1_a1):
-            predicate_alignments.append((tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
-                                         tweet_id2, sent2, sf_pred2, pred2, s1_a0, s1_a1))
+            predicate_alignments.append(((i, j), (tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
+                                                  tweet_id2, sent2, sf_pred2, pred2, s1_a0, s1_a1)))
             continue
 
+        # Are predicates aligned?
+        is_aligned_pred = len(features[i].pred_synonyms.intersection(features[j].pred_synonyms)) > 0
+
         # 2) all three items are aligned
         if is_aligned_pred and is_aligned_a0_a0 and is_aligned_a1_a1:
-            predicate_alignments.append((tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
-                                         tweet_id2, sent2, sf_pred2, pred2, s1_a0, s1_a1))
+            predicate_alignments.append(((i, j), (tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
+                                                  tweet_id2, sent2, sf_pred2, pred2, s1_a0, s1_a1)))
             continue
 
         # Same as before, but with reversed arguments
         if (is_eq_a0_a1 and is_aligned_a1_a0) or (is_aligned_a0_a1 and is_eq_a1_a0):
             new_pred2 = pred2.replace('{a0}', 'ARG0').replace('{a1}', '{a0}').replace('ARG0', '{a1}')
             new_sf_pred2 = sf_pred2.replace('{a0}', 'ARG0').replace('{a1}', '{a0}').replace('ARG0', '{a1}')
-            predicate_alignments.append((tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
-                                         tweet_id2, sent2, new_sf_pred2, new_pred2, s1_a1, s1_a0))
+            predicate_alignments.append(((i, j), (tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
+                                                  tweet_id2, sent2, new_sf_pred2, new_pred2, s1_a1, s1_a0)))
             continue
 
         if is_aligned_pred and is_aligned_a0_a1 and is_aligned_a1_a0:
             new_pred2 = pred2.replace('{a0}', 'ARG0').replace('{a1}', '{a0}').replace('ARG0', '{a1}')
             new_sf_pred2 = sf_pred2.replace('{a0}', 'ARG0').replace('{a1}', '{a0}').replace('ARG0', '{a1}')
-            predicate_alignments.append((tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
-                                         tweet_id2, sent2, new_sf_pred2, new_pred2, s1_a1, s1_a0))
+            predicate_alignments.append(((i, j), (tweet_id1, sent1, sf_pred1, pred1, s0_a0, s0_a1,
+                                                  tweet_id2, sent2, new_sf_pred2, new_pred2, s1_a1, s1_a0)))
             continue
 
     return predicate_alignments
 
 
-def is_eq_arg(x, y):
+def batch_fuzzy_match(scorer, pairs, threshold):
     """
-    Return whether these two words are equal, with fuzzy string matching.
-    :param x: the first argument
-    :param y: the second argument
-    :return: Whether they are equal
+    Score many string pairs with a fuzzy string matching scorer, scoring each distinct pair only once,
+    and compare the scores to the threshold.
+    :param scorer: the fuzzywuzzy scorer, e.g. fuzz.ratio
+    :param pairs: a list of (x, y) string pairs
+    :param threshold: the minimal score of a match
+    :return: a list of booleans: whether each pair is a match
     """
-    if fuzz.ratio(x, y) >= 90:
-        return True
+    is_match = {}
+
+    for pair in pairs:
+        if pair not in is_match:
+            is_match[pair] = scorer(*pair) >= threshold
+
+    return [is_match[pair] for pair in pairs]
+
+
+def batch_is_eq_preds(pairs):
+    """
+    Return whether each pair of predicates is equal, with fuzzy string matching.
+    :param pairs: a list of (p1, p2) predicate pairs
+    :return: a list of booleans: whether each pair is equal (see is_eq_preds)
+    """
+    is_eq = batch_fuzzy_match(fuzz.ratio, pairs, 90)
+    return [is_eq_pair or is_same_verb(p1, p2) for (p1, p2), is_eq_pair in zip(pairs, is_eq)]
+
+
+def batch_is_eq_args(pairs):
+    """
+    Return whether each pair of arguments is equal, with fuzzy string matching.
+    :param pairs: a list of (x, y) ArgumentFeatures pairs
+    :return: a list of booleans: whether each pair is equal, or equal with numbers converted to words
+    (e.g. 'two girls' and '2 girls')
+    """
+    is_eq = batch_fuzzy_match(fuzz.ratio, [(x.text, y.text) for x, y in pairs], 90)
+
+    # Compare the arguments with numbers converted to words, only for the pairs that didn't match
+    not_eq = [k for k, is_eq_pair in enumerate(is_eq) if not is_eq_pair]
+    is_eq_numbers = batch_fuzzy_match(fuzz.ratio, [(pairs[k][0].expanded, pairs[k][1].expanded) for k in not_eq], 85)
+
+    for k, is_eq_pair in zip(not_eq, is_eq_numbers):
+        is_eq[k] = is_eq_pair
 
-    # Convert numbers to words
-    x_words = [num2words(int(w)).replace('-', ' ') if w.isdigit() else w for w in x.split()]
-    y_words = [num2words(int(w)).replace('-', ' ') if w.isdigit() else w for w in y.split()]
+    return is_eq
 
-    # Partial entailment with equivalence, e.g. 'two girls' -> 'two kids':
-    return fuzz.ratio(' '.join(x_words), ' '.join(y_words)) >= 85
+
+def batch_is_aligned_args(pairs, is_eq):
+    """
+    Return whether each pair of arguments is equal or aligned.
+    :param pairs: a list of (x, y) ArgumentFeatures pairs
+    :param is_eq: a list of booleans: whether each pair is equal
+    :return: a list of booleans: whether each pair is equal, partially matching, or aligned by the WordNet
+    synonyms of its words (see is_aligned_arg_synonyms)
+    """
+    not_eq = [k for k, is_eq_pair in enumerate(is_eq) if not is_eq_pair]
+    is_partial_match = batch_fuzzy_match(fuzz.partial_ratio, [(pairs[k][0].padded, pairs[k][1].padded)
+                                                              for k in not_eq], 100)
+
+    is_aligned = list(is_eq)
+    for k, is_partial_match_pair in zip(not_eq, is_partial_match):
+        is_aligned[k] = is_partial_match_pair or \
+                        is_aligned_arg_synonyms(pairs[k][0].words_synonyms, pairs[k][1].words_synonyms)
+
+    return is_aligned
+
+
+def expand_numbers(x):
+    """
+    Convert the numbers in the argument to words, e.g. '2 girls' -> 'two girls'.
+    This is used through the expanded arguments cache, since the same arguments repeat in many candidate pairs.
+    :param x: the argument
+    :return: the argument with numbers converted to words
+    """
+    return ' '.join([expand_number(w) for w in x.split()])
+
+
+def expand_number(w):
+    """
+    Convert a number to words, e.g. '2' -> 'two'
+    :param w: the word
+    :return: the number in words, or the word if it is not a number that num2words can convert (e.g. unicode digits
+    such as u'\u00b2', which are digits but not integers)
+    """
+    if not w.isdigit():
+        return w
+
+    try:
+        return num2words(int(w)).replace('-', ' ')
+    except (ValueError, OverflowError):
+        return w
 
 
 def is_eq_preds(p1, p2):
@@ -218,13 +751,20 @@ def is_eq_preds(p1, p2):
     :param y: the second predicate
     :return: Whether they are equal
     """
-    global nlp
-
     # Levenshtein distance mostly
     if fuzz.ratio(p1, p2) >= 90:
         return True
 
-    # Same verb
+    return is_same_verb(p1, p2)
+
+
+def is_same_verb(p1, p2):
+    """
+    Return whether these two predicates have the same verb, up to an added "be" / "have".
+    :param p1: the first predicate
+    :param p2: the second predicate
+    :return: Whether they have the same verb
+    """
     if p1.replace('{a0} ', '{a0} be ') == p2 or p1.replace('{a0} ', '{a0} have ') == p2 or \
                     p2.replace('{a0} ', '{a0} be ') == p1 or p2.replace('{a0} ', '{a0} have ') == p1:
         return True
@@ -232,59 +772,71 @@ def is_eq_preds(p1, p2):
     return False
 
 
-def is_aligned_preds(x, y):
+def is_aligned_arg_synonyms(x_synonyms, y_synonyms):
     """
-    Return whether these two words are aligned: they occur in the same WordNet synset.
-    :param x: the first argument
-    :param y: the second argument
+    Return whether two arguments are aligned by the WordNet synonyms of their words.
+    :param x_synonyms: the synonyms of each (non stop word) word in the first argument
+    :param y_synonyms: the synonyms of each (non stop word) word in the second argument
     :return: Whether they are aligned
     """
-    global nlp
+    if len(x_synonyms) == 0 or len(y_synonyms) == 0:
+        return False
 
-    x_synonyms = set([lemma.lower().replace('_', ' ') for synset in wn.synsets(x) for lemma in synset.lemma_names()])
-    y_synonyms = set([lemma.lower().replace('_', ' ') for synset in wn.synsets(y) for lemma in synset.lemma_names()])
+    # One word - check whether there is intersection between synsets
+    if len(x_synonyms) == 1 and len(y_synonyms) == 1 and len(x_synonyms[0].intersection(y_synonyms[0])) > 0:
+        return True
 
-    return len([w for w in x_synonyms.intersection(y_synonyms) if not nlp.is_stop(w)]) > 0
+    # More than one word - align words from x with words from y
+    intersections = [len(s1.intersection(s2)) for s1 in x_synonyms for s2 in y_synonyms]
 
+    if len([intersection_len for intersection_len in intersections if intersection_len > 0]) >= \
+                    0.75 * max(len(x_synonyms), len(y_synonyms)):
+        return True
+
+    return False
 
-def is_aligned_arg(x, y):
+
+def get_words_synonyms(arg):
     """
-    Return whether these two arguments are aligned: they occur in the same WordNet synset.
-    :param x: the first argument
-    :param y: the second argument
-    :return: Whether they are aligned
+    Return the WordNet synonyms of each word in the argument, excluding stop words
+    :param arg: the argument
+    :return: a list of sets of synonyms, one for each word in arg which is not a stop word
     """
     global nlp
 
-    # Allow partial matching
-    if fuzz.partial_ratio(' ' + x + ' ', ' ' + y + ' ') == 100:
-        return True
+    return [synonyms[w] for w in arg.split() if not nlp.is_stop(w)]
 
-    x_words = [w for w in x.split() if not nlp.is_stop(w)]
-    y_words = [w for w in y.split() if not nlp.is_stop(w)]
 
-    if len(x_words) == 0 or len(y_words) == 0:
-        return False
+def sort_tokens(sent):
+    """
+    Return the sentence processed and with its tokens sorted, as compared by fuzz.token_sort_ratio
+    :param sent: the sentence
+    :return: the processed sentence with sorted tokens
+    """
+    return u' '.join(sorted(utils.full_process(sent, force_ascii=True).split())).strip()
 
-    x_synonyms = [set([lemma.lower().replace('_', ' ') for synset in wn.synsets(w) for lemma in synset.lemma_names()])
-                  for w in x_words]
-    y_synonyms = [set([lemma.lower().replace('_', ' ') for synset in wn.synsets(w) for lemma in synset.lemma_names()])
-                  for w in y_words]
 
-    # One word - check whether there is intersection between synsets
-    if len(x_synonyms) == 1 and len(y_synonyms) == 1 and \
-                    len([w for w in x_synonyms[0].intersection(y_synonyms[0]) if not nlp.is_stop(w)]) > 0:
-        return True
+def get_synonyms(w):
+    """
+    Return the WordNet synonyms of a word (or a predicate), without stop words.
+    This is used through the synonyms cache, since the same words repeat in many candidate pairs.
+    :param w: the word
+    :return: the set of synonyms of w which are not stop words
+    """
+    global nlp
 
-    # More than one word - align words from x with words from y
-    intersections = [len([w for w in s1.intersection(s2) if not nlp.is_stop(w)])
-                     for s1 in x_synonyms for s2 in y_synonyms]
+    w_synonyms = set([lemma.lower().replace('_', ' ') for synset in wn.synsets(w) for lemma in synset.lemma_names()])
+    return frozenset([syn for syn in w_synonyms if not nlp.is_stop(syn)])
 
-    if len([intersection_len for intersection_len in intersections if intersection_len > 0]) >= \
-                    0.75 * max(len(x_synonyms), len(y_synonyms)):
-        return True
 
-    return False
+# WordNet synonyms by word (in-memory only, unless a persistent file is given in main)
+synonyms = LRUCache(get_synonyms, SYNONYMS_CACHE_SIZE)
+
+# Arguments with numbers converted to words, by argument (in-memory only, unless a persistent file is given in main)
+expanded_args = LRUCache(expand_numbers, EXPANDED_ARGS_CACHE_SIZE)
+
+# The propositions indexed by the candidate batches in the current (alignment) process
+alignment_propositions = []
 
 
 if __name__ == '__main__':
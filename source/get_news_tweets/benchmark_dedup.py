@@ -0,0 +1,57 @@
+"""
+Usage:
+    benchmark_dedup --in=TWEETS_FILE [--capacity=CAPACITY] [--error-rate=ERROR_RATE]
+
+Benchmark the duplicate tweets filter of get_news_tweets_stream: replay a day of tweets into a set of the
+texts vs. into the scalable Bloom filter, and compare the time, the memory and the kept tweets.
+
+Options:
+   --in=TWEETS_FILE         A tab-separated tweets file whose last column is the tweet text, e.g. a day of
+                            tweets collected by get_news_tweets_stream
+   --capacity=CAPACITY      The number of tweets the filter is initially sized for [default: 100000]
+   --error-rate=ERROR_RATE  The probability that a new tweet is dropped as a duplicate [default: 0.000001]
+"""
+import sys
+import time
+import codecs
+
+from docopt import docopt
+from dedup import ScalableBloomFilter
+
+
+def main():
+
+    args = docopt(__doc__)
+
+    with codecs.open(args['--in'], 'r', 'utf-8') as f_in:
+        texts = [line.rstrip('\n').split('\t')[-1].encode('utf-8') for line in f_in]
+
+    if len(texts) == 0:
+        print 'No tweets'
+        return
+
+    # Before: a set of the texts
+    start = time.time()
+    tweets_set = set()
+    kept_by_set = []
+    for text in texts:
+        if not text in tweets_set:
+            kept_by_set.append(text)
+            tweets_set.add(text)
+    set_time = time.time() - start
+    set_memory = sys.getsizeof(tweets_set) + sum(sys.getsizeof(text) for text in tweets_set)
+
+    # After: a scalable Bloom filter of the text hashes
+    start = time.time()
+    tweets_filter = ScalableBloomFilter(int(args['--capacity']), float(args['--error-rate']))
+    kept_by_filter = [text for text in texts if tweets_filter.add(text)]
+    filter_time = time.time() - start
+
+    print 'Replayed %d tweets, %d unique, %d dropped by the filter as false positives' % \
+          (len(texts), len(kept_by_set), len(kept_by_set) - len(kept_by_filter))
+    print 'Set: %.2f microseconds per tweet, %.1f MB' % (set_time * 1e6 / len(texts), set_memory / 1048576.0)
+    print 'Bloom filter: %.2f microseconds per tweet, %s' % (filter_time * 1e6 / len(texts), tweets_filter.report())
+
+
+if __name__ == '__main__':
+    main()
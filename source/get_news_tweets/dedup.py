@@ -0,0 +1,295 @@
+"""
+Compact indices of the tweet texts seen by the news stream, to drop exact and near duplicates without keeping
+the texts in memory.
+"""
+import math
+import array
+import struct
+import hashlib
+import itertools
+
+from collections import OrderedDict
+
+# The number of texts the first filter is sized for
+INITIAL_CAPACITY = 100000
+
+# The probability that a new text is reported as seen
+ERROR_RATE = 0.000001
+
+# Each new filter is sized for GROWTH_FACTOR times the texts of the previous one, with an error rate
+# ERROR_TIGHTENING_RATIO times lower, so that the total error rate is bounded
+GROWTH_FACTOR = 2
+ERROR_TIGHTENING_RATIO = 0.5
+
+# The Jaccard similarity of the character shingles from which a text is a near duplicate
+JACCARD_THRESHOLD = 0.8
+
+# The number of hash functions in the MinHash signatures, the number of characters in a shingle,
+# and the number of recent texts kept in the near duplicates index
+NUM_PERMUTATIONS = 64
+SHINGLE_SIZE = 4
+NEAR_DUPLICATES_INDEX_SIZE = 100000
+
+
+class BloomFilter(object):
+    """
+    A Bloom filter sized for a given number of texts and error rate, in a bit array. The bit indices of a text are
+    computed from its two hashes by enhanced double hashing, modulo a prime number of bits (with a number of bits
+    that has small factors, the indices of many texts repeat, and the error rate is higher).
+    """
+    def __init__(self, capacity, error_rate):
+        """
+        Initialize an empty filter
+        :param capacity: the number of texts the filter is sized for
+        :param error_rate: the false positive rate when the filter is full
+        """
+        self.capacity = capacity
+        self.num_of_bits = next_prime(int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_of_hashes = max(1, int(math.ceil(-math.log(error_rate, 2))))
+        self.bits = bytearray((self.num_of_bits + 7) // 8)
+        self.count = 0
+
+    def __contains__(self, hashes):
+        """
+        Returns whether the text was (probably) added
+        :param hashes: the two 64-bit hashes of the text
+        :return: whether all the bits of the text are set
+        """
+        return all(self.bits[index >> 3] & (1 << (index & 7)) for index in self.indices(hashes))
+
+    def add(self, hashes):
+        """
+        Set the bits of a text
+        :param hashes: the two 64-bit hashes of the text
+        """
+        for index in self.indices(hashes):
+            self.bits[index >> 3] |= 1 << (index & 7)
+
+        self.count += 1
+
+    def indices(self, hashes):
+        """
+        Returns the bit indices of a text, combining its two hashes (enhanced double hashing: the step between
+        the indices also grows, which avoids the repeating indices of plain double hashing)
+        :param hashes: the two 64-bit hashes of the text
+        :return: a generator of the bit indices
+        """
+        index, step = hashes[0] % self.num_of_bits, hashes[1] % self.num_of_bits
+
+        for i in xrange(self.num_of_hashes):
+            yield index
+            index = (index + step) % self.num_of_bits
+            step = (step + i + 1) % self.num_of_bits
+
+
+class ScalableBloomFilter(object):
+    """
+    A set of texts with a bounded false positive rate and no false negatives, which grows by adding larger
+    Bloom filters when the last one is full. It takes a few bytes per text, regardless of the text length.
+    """
+    def __init__(self, initial_capacity=INITIAL_CAPACITY, error_rate=ERROR_RATE):
+        """
+        Initialize an empty set
+        :param initial_capacity: the number of texts the first filter is sized for
+        :param error_rate: the probability that a new text is reported as seen
+        """
+        self.error_rate = error_rate
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - ERROR_TIGHTENING_RATIO))]
+
+    def __contains__(self, text):
+        """
+        Returns whether the text was (probably) added
+        :param text: the text
+        :return: whether the text was added, or with probability error_rate, a new text
+        """
+        hashes = text_hashes(text)
+        return any(hashes in bloom_filter for bloom_filter in self.filters)
+
+    def __len__(self):
+        return sum(bloom_filter.count for bloom_filter in self.filters)
+
+    def add(self, text):
+        """
+        Add a text if it wasn't added before
+        :param text: the text
+        :return: whether the text is new
+        """
+        hashes = text_hashes(text)
+
+        if any(hashes in bloom_filter for bloom_filter in self.filters):
+            return False
+
+        last = self.filters[-1]
+
+        if last.count >= last.capacity:
+            last = BloomFilter(last.capacity * GROWTH_FACTOR,
+                               self.error_rate * (1 - ERROR_TIGHTENING_RATIO) *
+                               ERROR_TIGHTENING_RATIO ** len(self.filters))
+            self.filters.append(last)
+
+        last.add(hashes)
+        return True
+
+    def memory_usage(self):
+        """
+        Returns the size of the bit arrays in bytes
+        :return: the size of the bit arrays in bytes
+        """
+        return sum(len(bloom_filter.bits) for bloom_filter in self.filters)
+
+    def report(self):
+        """
+        Returns a textual summary of the number of texts and the memory usage
+        :return: a textual summary of the number of texts and the memory usage
+        """
+        return '{} texts in {} filters, {:.1f} MB ({:.2f} bytes per text)'.format(
+            len(self), len(self.filters), self.memory_usage() / 1048576.0,
+            self.memory_usage() * 1.0 / max(1, len(self)))
+
+
+def next_prime(n):
+    """
+    Returns the smallest prime which is not smaller than n
+    :param n: the number
+    :return: the smallest prime which is not smaller than n
+    """
+    n = max(n, 2)
+
+    while any(n % d == 0 for d in xrange(2, int(math.sqrt(n)) + 1)):
+        n += 1
+
+    return n
+
+
+def text_hashes(text):
+    """
+    Returns two 64-bit hashes of a text
+    :param text: the text (unicode texts are encoded in UTF-8)
+    :return: a tuple of two 64-bit hashes
+    """
+    digest = hashlib.md5(text.encode('utf-8') if isinstance(text, unicode) else text).digest()
+    return struct.unpack('<QQ', digest)
+
+
+class NearDuplicateFilter(object):
+    """
+    Drops texts which are similar to a recently added text (e.g. a syndicated headline with minor edits).
+    The Jaccard similarity of the character shingles is estimated with MinHash signatures (with hash functions
+    taken from salted SHA-512 digests of the shingles), and the candidates are found with locality-sensitive
+    hashing (LSH) of signature bands. The index keeps the signatures of the last max_size texts only.
+    """
+    def __init__(self, threshold=JACCARD_THRESHOLD, num_perm=NUM_PERMUTATIONS, max_size=NEAR_DUPLICATES_INDEX_SIZE,
+                 seed=1):
+        """
+        Initialize an empty index
+        :param threshold: the Jaccard similarity from which a text is a near duplicate
+        :param num_perm: the number of hash functions in the MinHash signature
+        :param max_size: the maximal number of texts in the index
+        :param seed: the salt of the hash functions
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self.num_perm = num_perm
+
+        # Each digest has 16 32-bit hashes
+        self.salted_hashes = [hashlib.sha512('{}:{}:'.format(seed, i)) for i in range((num_perm + 15) // 16)]
+        self.hashes_format = '<{}I'.format(num_perm)
+
+        # The largest band whose LSH threshold, (1 / num_bands) ^ (1 / rows), is not above the Jaccard threshold,
+        # so the near duplicates are likely to be candidates
+        self.rows = max([rows for rows in range(1, num_perm + 1) if num_perm % rows == 0 and
+                         (1.0 * rows / num_perm) ** (1.0 / rows) <= threshold] or [1])
+        self.num_bands = num_perm / self.rows
+        self.rotate()
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def add(self, text):
+        """
+        Add a text if no near duplicate of it is in the index
+        :param text: the text
+        :return: whether the text is new
+        """
+        signature = self.signature(text)
+        keys = self.band_keys(signature)
+
+        for band, key in enumerate(keys):
+            for text_id in self.bands[band].get(key, ()):
+                if estimate_jaccard(signature, self.signatures[text_id]) >= self.threshold:
+                    return False
+
+        self.signatures[self.next_id] = signature
+
+        for band, key in enumerate(keys):
+            self.bands[band].setdefault(key, []).append(self.next_id)
+
+        self.next_id += 1
+
+        # Remove the oldest text
+        if len(self.signatures) > self.max_size:
+            text_id, old_signature = self.signatures.popitem(last=False)
+
+            for band, key in enumerate(self.band_keys(old_signature)):
+                bucket = self.bands[band][key]
+                bucket.remove(text_id)
+
+                if len(bucket) == 0:
+                    del self.bands[band][key]
+
+        return True
+
+    def rotate(self):
+        """
+        Empty the index, e.g. when a new day of tweets starts
+        """
+        self.signatures = OrderedDict()
+        self.bands = [{} for _ in range(self.num_bands)]
+        self.next_id = 0
+
+    def signature(self, text):
+        """
+        Returns the MinHash signature of a text
+        :param text: the text
+        :return: an array of the minimal hash of the text's shingles by each hash function
+        """
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+
+        text = ' '.join(text.lower().split())
+        shingles = set(text[i:i + SHINGLE_SIZE] for i in xrange(max(1, len(text) - SHINGLE_SIZE + 1)))
+
+        return array.array('I', map(min, itertools.izip(*[self.shingle_hashes(shingle) for shingle in shingles])))
+
+    def shingle_hashes(self, shingle):
+        """
+        Returns the hashes of a shingle by each hash function
+        :param shingle: the shingle
+        :return: a tuple of num_perm 32-bit hashes
+        """
+        digests = []
+
+        for salted_hash in self.salted_hashes:
+            digest = salted_hash.copy()
+            digest.update(shingle)
+            digests.append(digest.digest())
+
+        return struct.unpack_from(self.hashes_format, ''.join(digests))
+
+    def band_keys(self, signature):
+        """
+        Returns the LSH keys of a signature
+        :param signature: the MinHash signature
+        :return: the key of each band
+        """
+        return [hash(tuple(signature[band * self.rows:(band + 1) * self.rows])) for band in range(self.num_bands)]
+
+
+def estimate_jaccard(signature1, signature2):
+    """
+    Returns the estimated Jaccard similarity of two texts
+    :param signature1: the MinHash signature of the first text
+    :param signature2: the MinHash signature of the second text
+    :return: the fraction of equal hashes
+    """
+    return sum(1 for h1, h2 in itertools.izip(signature1, signature2) if h1 == h2) * 1.0 / len(signature1)
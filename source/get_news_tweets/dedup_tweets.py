@@ -0,0 +1,41 @@
+"""
+Usage:
+    dedup_tweets --in=TWEETS_FILE --out=OUTPUT_FILE [--threshold=THRESHOLD]
+
+Remove the exact and near duplicates from a day of tweets collected by get_news_tweets_stream
+(news_stream/tweets/<date>), keeping the first tweet of each group of near duplicates.
+
+Options:
+   --in=TWEETS_FILE       The tweets file
+   --out=OUTPUT_FILE      The output file, in the same format
+   --threshold=THRESHOLD  The Jaccard similarity from which a tweet is a near duplicate [default: 0.8]
+"""
+import codecs
+
+from docopt import docopt
+from dedup import ScalableBloomFilter, NearDuplicateFilter
+
+
+def main():
+
+    args = docopt(__doc__)
+
+    tweets = ScalableBloomFilter()
+    near_duplicates = NearDuplicateFilter(float(args['--threshold']))
+    num_of_tweets = num_of_kept = 0
+
+    with codecs.open(args['--in'], 'r', 'utf-8') as f_in:
+        with codecs.open(args['--out'], 'w', 'utf-8') as f_out:
+            for line in f_in:
+                num_of_tweets += 1
+                text = line.rstrip('\n').split('\t')[-1]
+
+                if tweets.add(text) and near_duplicates.add(text):
+                    f_out.write(line)
+                    num_of_kept += 1
+
+    print 'Kept %d out of %d tweets' % (num_of_kept, num_of_tweets)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,22 +5,32 @@ access_token_secret='YOUR_KEY_HERE'
 dropbox_access_token='YOUR_KEY_HERE'
 repository_dir='REPOSITORY_DIR'
 
+# Collect news, starting a new file every day. The collector is restarted if it stops (e.g. after a crash),
+# and continues the file of the current day.
+(while true; do
+  python -u get_news_tweets_stream.py $consumer_key $consumer_secret $access_token $access_token_secret;
+  sleep 60;
+done) &
+
 while true; do 
 	
 	while [ $(date +%H:%M) != "00:00" ]; do
 		sleep 59
   done
   
-  # Start collecting news for the next day
-  pkill -f get_news_tweets_stream.py;
-  python -u get_news_tweets_stream.py $consumer_key $consumer_secret $access_token $access_token_secret &
-  
-  # Get propositions and positive instances for the previous day, package and release a new version of the resource
+  # Get propositions and positive instances for the previous day, package and release a new version of the resource.
+  # Wait until the collector completes the file of the previous day (it is written to $last_file.part until then).
   last_file=`date -d "yesterday" '+%Y_%m_%d'`;
-  (python -u prop_extraction.py --in=news_stream/tweets/$last_file --out=news_stream/props/$last_file.prop > prop.log;
-  python -u get_corefering_predicates.py news_stream/props/$last_file.prop news_stream/positive/$last_file;
-  cat news_stream/positive/* | cut -f1,2,4,5,6,7,8,10,11,12,13,14 > resource;
-  python -u package_resource.py resource resource_dir;
+  (while [ ! -f news_stream/tweets/$last_file ]; do sleep 10; done;
+  # Extract, align and package the day as a pipeline (the first time, package all the days one after the other)
+  if [ -f resource_state ]; then
+    python -u run_pipeline.py --out=resource_dir --state=resource_state --batch-size=1000 news_stream/tweets/$last_file > pipeline.log;
+  else
+    python -u prop_extraction.py --in=news_stream/tweets/$last_file --out=news_stream/props/$last_file.prop --batch-size=1000 > prop.log;
+    python -u get_corefering_predicates.py news_stream/props/$last_file.prop news_stream/positive/$last_file;
+    cat news_stream/positive/* | cut -f1,2,4,5,6,7,8,10,11,12,13,14 > resource;
+    python -u package_resource.py --state=resource_state resource resource_dir;
+  fi;
   zip resource_dir/resource.zip resource_dir/*.tsv;
   python upload_to_dropbox.py $dropbox_access_token resource_dir;
   wc -l resource_dir/instances.tsv > $repository_dir/resource/curr_stats;
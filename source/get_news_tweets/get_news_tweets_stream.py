@@ -1,13 +1,18 @@
 import sys
 import time
-import codecs
+import signal
 import datetime
 
 sys.path.append('../')
 
 from docopt import docopt
-from common.common import *
+from common.common import clean_tweet
 from TwitterSearch import *
+from dedup import ScalableBloomFilter, NearDuplicateFilter, INITIAL_CAPACITY, ERROR_RATE
+from segment_writer import SegmentWriter, SEGMENT_FORMATS, FSYNC_INTERVAL
+
+# Print the memory usage of the seen tweets every REPORT_EVERY new tweets
+REPORT_EVERY = 10000
 
 
 def main():
@@ -25,9 +30,10 @@ def main():
         This filter retrieves tweets from the requested date (or from now if left empty) that contain links to news
         web sites.
 
-        This script will save the tweets in a file named by the date they were created at.
+        This script will save the tweets in a file named by the date they were created at, and start a new file
+        when the date changes. The file is named <date>.part until it is complete.
 
-        Usage: get_news_tweets_stream.py <consumer_key> <consumer_secret> <access_token> <access_token_secret> [<until>]
+        Usage: get_news_tweets_stream.py [--dedup_capacity=<dedup_capacity>] [--dedup_error_rate=<dedup_error_rate>] [--near_duplicates=<threshold>] [--rotate=<rotate>] [--compress] [--fsync_interval=<fsync_interval>] <consumer_key> <consumer_secret> <access_token> <access_token_secret> [<until>]
 
         Argumments:
             consumer_key  Consumer key for the Twitter API
@@ -37,6 +43,17 @@ def main():
             until  (Optional): date in the format YYYY/MM/dd. Retrieve tweets only until this date.
             If this argument is not specified, it will retrieve current tweets.
             The Search API only supports up to one week ago.
+            dedup_capacity  (Optional): the number of tweets the duplicate filter is initially sized for
+            (default: 100000). It grows when more tweets are seen.
+            dedup_error_rate  (Optional): the probability that a new tweet is dropped as a duplicate
+            (default: 0.000001).
+            near_duplicates  (Optional): drop the tweets whose Jaccard similarity to a tweet of the same day
+            is at least this threshold (e.g. 0.8), in addition to the exact duplicates.
+            rotate  (Optional): start a new file every "day" (default, news_stream/tweets/<date>) or "hour"
+            (news_stream/tweets/<date>_<hour>).
+            compress  (Optional): compress the files with gzip (adding a .gz suffix).
+            fsync_interval  (Optional): the maximal time in seconds between flushing the tweets to the disk
+            (default: 60).
     """)
 
     consumer_key = args['<consumer_key>']
@@ -54,7 +71,7 @@ def main():
         out_tweet_file = 'news_stream/tweets/%d_%02d_%02d' % (year, month, day - 1)
         tso.set_until(datetime.date(year, month, day))
     else:
-        out_tweet_file = 'news_stream/tweets/' + time.strftime('%Y_%m_%d')
+        out_tweet_file = 'news_stream/tweets/' + SEGMENT_FORMATS[args['--rotate'] or 'day']
 
 
     sleep_for = 10
@@ -63,9 +80,20 @@ def main():
     ts = TwitterSearch(consumer_key=consumer_key, consumer_secret=consumer_secret,
                        access_token=access_token, access_token_secret=access_token_secret)
 
-    tweets = set()
+    # The texts of the tweets we've seen today, without keeping them in memory
+    dedup_capacity = int(args['--dedup_capacity'] or INITIAL_CAPACITY)
+    dedup_error_rate = float(args['--dedup_error_rate'] or ERROR_RATE)
+    tweets = ScalableBloomFilter(dedup_capacity, dedup_error_rate)
+    near_duplicates = NearDuplicateFilter(float(args['--near_duplicates'])) if args['--near_duplicates'] else None
+    index_day = time.strftime('%Y_%m_%d')
+
+    f_out = SegmentWriter(out_tweet_file, args['--compress'],
+                          fsync_interval=float(args['--fsync_interval'] or FSYNC_INTERVAL))
 
-    with codecs.open(out_tweet_file, 'w', 'utf-8') as f_out:
+    # Flush the current file also when the script is killed (a restarted script continues it)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    try:
 
         # Stop this manually
         while True:
@@ -75,9 +103,19 @@ def main():
                 for tweet in ts.search_tweets_iterable(tso):
                     text = clean_tweet(tweet['text'].encode(sys.getdefaultencoding(), 'ignore').replace('\n', ' '))
 
-                    if not text in tweets:
-                        print >> f_out, '\t'.join((tweet['created_at'], str(tweet['id']), tweet['user']['screen_name'], text))
-                        tweets.add(text)
+                    # A new day: start over the duplicates filters
+                    if index_day != time.strftime('%Y_%m_%d'):
+                        index_day = time.strftime('%Y_%m_%d')
+                        tweets = ScalableBloomFilter(dedup_capacity, dedup_error_rate)
+
+                        if near_duplicates is not None:
+                            near_duplicates.rotate()
+
+                    if tweets.add(text) and (near_duplicates is None or near_duplicates.add(text)):
+                        f_out.write('\t'.join((tweet['created_at'], str(tweet['id']), tweet['user']['screen_name'], text)))
+
+                        if len(tweets) % REPORT_EVERY == 0:
+                            print 'Seen tweets:', tweets.report()
 
                     current_amount_of_queries = ts.get_statistics()[0]
 
@@ -90,6 +128,9 @@ def main():
                 time.sleep(sleep_for)
                 pass
 
+    finally:
+        f_out.close()
+
     
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""
+Write the collected tweets to a file per day (or hour), rotated by the collector itself.
+"""
+import os
+import time
+import glob
+import gzip
+import zlib
+
+# The size of the write buffer in bytes
+BUFFER_SIZE = 1 << 20
+
+# The maximal time in seconds between flushing the written lines to the disk
+FSYNC_INTERVAL = 60
+
+# The name of each segment by its rotation period
+SEGMENT_FORMATS = { 'day' : '%Y_%m_%d', 'hour' : '%Y_%m_%d_%H' }
+
+# The suffix of the segment which is still being written
+PARTIAL_SUFFIX = '.part'
+
+
+class SegmentWriter(object):
+    """
+    Writes lines to a segment file named by the current time, and starts a new segment when the name changes.
+    The segment is written to <name>.part, and renamed to <name> only when the next segment starts, so the next
+    steps of the pipeline can wait for it. The lines are buffered and flushed to the disk every fsync_interval
+    seconds, so a crash loses at most the last interval. A restarted writer recovers the segment of the current
+    time from a crash (removing the partially written line or gzip member) and appends to it, and completes the
+    segments of previous times which were left partial.
+    """
+    def __init__(self, name_format, compress=False, buffer_size=BUFFER_SIZE, fsync_interval=FSYNC_INTERVAL):
+        """
+        Initialize the writer
+        :param name_format: the path of the segments, formatted with time.strftime (e.g. 'tweets/%Y_%m_%d').
+        A path without time directives is a single segment, which is completed when the writer is closed.
+        :param compress: whether to compress the segments with gzip (adding a .gz suffix)
+        :param buffer_size: the size of the write buffer in bytes
+        :param fsync_interval: the maximal time in seconds between flushing the written lines to the disk
+        """
+        self.name_format = name_format + ('.gz' if compress else '')
+        self.compress = compress
+        self.buffer_size = buffer_size
+        self.fsync_interval = fsync_interval
+        self.single_segment = time.strftime(self.name_format) == self.name_format
+        self.segment = self.raw_file = self.f_out = None
+        self.last_fsync = time.time()
+
+    def write(self, line):
+        """
+        Write a line to the current segment, rotating and flushing it if needed
+        :param line: the line, without the new line character (unicode lines are encoded in UTF-8)
+        """
+        self.rotate()
+        self.f_out.write((line.encode('utf-8') if isinstance(line, unicode) else line) + '\n')
+
+        if time.time() - self.last_fsync >= self.fsync_interval:
+            self.flush()
+
+    def rotate(self):
+        """
+        Complete the current segment and start a new one, if the segment name of the current time is different
+        """
+        segment = time.strftime(self.name_format)
+
+        if segment == self.segment:
+            return
+
+        if self.segment is None:
+            self.complete_stale_segments(segment)
+        else:
+            previous_segment = self.segment
+            self.close()
+            os.rename(previous_segment + PARTIAL_SUFFIX, previous_segment)
+
+        # Continue a segment which was completed by a previous run (e.g. a single segment)
+        if os.path.exists(segment) and not os.path.exists(segment + PARTIAL_SUFFIX):
+            os.rename(segment, segment + PARTIAL_SUFFIX)
+
+        # Continue the segment written by a previous run
+        if os.path.exists(segment + PARTIAL_SUFFIX):
+            recover_segment(segment + PARTIAL_SUFFIX, self.compress)
+
+        self.segment = segment
+        self.raw_file = open(segment + PARTIAL_SUFFIX, 'ab', self.buffer_size)
+
+        # Appending to a compressed segment adds a gzip member, which gzip reads as a continuation
+        self.f_out = gzip.GzipFile(fileobj=self.raw_file, mode='ab') if self.compress else self.raw_file
+
+    def complete_stale_segments(self, segment):
+        """
+        Complete the partial segments of previous times, left by a previous run which was stopped before
+        they were rotated
+        :param segment: the segment of the current time
+        """
+        if self.single_segment:
+            return
+
+        pattern = os.path.join(os.path.dirname(segment), '*' + ('.gz' if self.compress else '') + PARTIAL_SUFFIX)
+
+        for partial_file in glob.glob(pattern):
+            if partial_file != segment + PARTIAL_SUFFIX:
+                recover_segment(partial_file, self.compress)
+                os.rename(partial_file, partial_file[:-len(PARTIAL_SUFFIX)])
+
+    def flush(self):
+        """
+        Flush the written lines to the disk. A compressed segment ends the current gzip member and starts a new one,
+        so that the flushed lines can be verified and recovered after a crash.
+        """
+        if self.f_out is not None:
+            if self.compress:
+                self.f_out.close()
+                self.f_out = gzip.GzipFile(fileobj=self.raw_file, mode='ab')
+
+            self.raw_file.flush()
+            os.fsync(self.raw_file.fileno())
+
+        self.last_fsync = time.time()
+
+    def close(self):
+        """
+        Flush the current segment to the disk and close it. The segment stays partial (unless it is a single segment),
+        and a restarted writer continues it.
+        """
+        if self.f_out is None:
+            return
+
+        if self.compress:
+            self.f_out.close()
+
+        self.raw_file.flush()
+        os.fsync(self.raw_file.fileno())
+        self.raw_file.close()
+
+        if self.single_segment:
+            os.rename(self.segment + PARTIAL_SUFFIX, self.segment)
+
+        self.segment = self.raw_file = self.f_out = None
+
+
+def recover_segment(partial_file, compress=False):
+    """
+    Remove the partially written line at the end of a segment, e.g. after a crash. A compressed segment is
+    rewritten with the complete lines that can be decompressed, since its last gzip member may be unterminated.
+    :param partial_file: the segment file
+    :param compress: whether the segment is compressed with gzip
+    """
+    if compress:
+        recover_compressed_segment(partial_file)
+        return
+
+    with open(partial_file, 'r+b') as f_in:
+        f_in.seek(0, os.SEEK_END)
+        end = f_in.tell()
+
+        # Find the last new line character, reading backwards
+        while end > 0:
+            f_in.seek(max(0, end - BUFFER_SIZE))
+            block = f_in.read(end - max(0, end - BUFFER_SIZE))
+
+            if '\n' in block:
+                end = end - len(block) + block.rindex('\n') + 1
+                break
+
+            end -= len(block)
+
+        f_in.truncate(end)
+
+
+def recover_compressed_segment(partial_file):
+    """
+    Rewrite a compressed segment with its complete gzip members. The last member may be unterminated after a crash,
+    and its data (written after the last flush) can't be verified, so it is removed.
+    :param partial_file: the segment file
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    member = []
+
+    with open(partial_file, 'rb') as f_in:
+        with open(partial_file + '.tmp', 'wb') as raw_file:
+            f_out = gzip.GzipFile(fileobj=raw_file, mode='wb')
+
+            try:
+                for block in iter(lambda: f_in.read(BUFFER_SIZE), ''):
+                    member.append(decompressor.decompress(block))
+
+                    # The end of a member (its checksum was verified): write it and decompress the next one
+                    while decompressor.unused_data != '':
+                        f_out.write(''.join(member))
+                        unused_data = decompressor.unused_data
+                        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                        member = [decompressor.decompress(unused_data)]
+
+                if is_member_complete(decompressor):
+                    f_out.write(''.join(member))
+
+            # A corrupted member: remove it and the rest of the file
+            except zlib.error:
+                pass
+
+            f_out.close()
+            raw_file.flush()
+            os.fsync(raw_file.fileno())
+
+    os.rename(partial_file + '.tmp', partial_file)
+
+
+def is_member_complete(decompressor):
+    """
+    Returns whether the gzip member was decompressed completely, i.e. additional data would not be part of it
+    :param decompressor: the decompressor of the member, after all its data
+    :return: whether the gzip member was decompressed completely
+    """
+    decompressor = decompressor.copy()
+
+    try:
+        decompressor.decompress('\0')
+    except zlib.error:
+        return False
+
+    return decompressor.unused_data == '\0'
@@ -0,0 +1,81 @@
+"""
+Tests of the duplicate tweets filters (run from this directory: python -m unittest test_dedup)
+"""
+import unittest
+
+from dedup import BloomFilter, ScalableBloomFilter, NearDuplicateFilter, text_hashes, next_prime
+
+# The number of texts (not added to the filter) probed for false positives
+NUM_OF_PROBES = 2000
+
+
+def false_positive_rate(capacity, error_rate, num_of_filters):
+    """
+    Returns the false positive rate of full Bloom filters, each with different texts
+    :param capacity: the number of texts each filter is sized for, and filled with
+    :param error_rate: the error rate each filter is sized for
+    :param num_of_filters: the number of filters
+    :return: the ratio of texts which were not added but were reported as added
+    """
+    false_positives = 0
+
+    for f in range(num_of_filters):
+        bloom_filter = BloomFilter(capacity, error_rate)
+
+        for i in range(capacity):
+            bloom_filter.add(text_hashes('added {} {}'.format(f, i)))
+
+        false_positives += sum(1 for i in range(NUM_OF_PROBES)
+                               if text_hashes('probed {} {}'.format(f, i)) in bloom_filter)
+
+    return false_positives * 1.0 / (num_of_filters * NUM_OF_PROBES)
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_false_positive_rate(self):
+        for capacity, error_rate in [(100, 0.01), (100, 0.001), (1000, 0.01), (50, 0.05)]:
+            rate = false_positive_rate(capacity, error_rate, 100)
+
+            # A small margin for the rounding of the number of hash functions and the variance of the filters
+            self.assertLessEqual(rate, error_rate * 1.1, '{:.3%} false positives with capacity {} and error rate {}'.
+                                 format(rate, capacity, error_rate))
+
+    def test_next_prime(self):
+        self.assertEqual([2, 2, 3, 5, 967], [next_prime(n) for n in [0, 2, 3, 4, 959]])
+
+
+class ScalableBloomFilterTest(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        tweets = ScalableBloomFilter(100, 0.01)
+
+        for i in range(1000):
+            tweets.add('tweet {}'.format(i))
+
+        self.assertTrue(all('tweet {}'.format(i) in tweets for i in range(1000)))
+        self.assertFalse(any(tweets.add('tweet {}'.format(i)) for i in range(1000)))
+        self.assertGreater(len(tweets.filters), 1)
+
+    def test_false_positive_rate(self):
+        tweets = ScalableBloomFilter(100, 0.01)
+
+        for i in range(10000):
+            tweets.add('tweet {}'.format(i))
+
+        # The error rate is bounded by the sum of the error rates of the filters, with the same margin
+        false_positives = sum(1 for i in range(100000) if 'other tweet {}'.format(i) in tweets)
+        self.assertLessEqual(false_positives / 100000.0, 0.01 * 1.1)
+
+
+class NearDuplicateFilterTest(unittest.TestCase):
+
+    def test_near_duplicates(self):
+        near_duplicates = NearDuplicateFilter(0.8)
+        self.assertTrue(near_duplicates.add('Obama meets Putin in Moscow to discuss the war in Syria'))
+        self.assertFalse(near_duplicates.add('Obama meets Putin in Moscow to discuss the war in Syria!'))
+        self.assertTrue(near_duplicates.add('Apple releases a new iPhone in California'))
+
+
+if __name__ == '__main__':
+    unittest.main()
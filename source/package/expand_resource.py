@@ -1,22 +1,30 @@
 # Command line arguments
 import argparse
+
+from hydrator import HYDRATION_WORKERS
+
 ap = argparse.ArgumentParser()
 ap.add_argument('resource_file', help='The path for the resource without tweets.')
 ap.add_argument('consumer_key', help='Consumer key for the Twitter API')
 ap.add_argument('consumer_secret', help='Consumer secret for the Twitter API')
 ap.add_argument('access_token', help='Access key token for the Twitter API')
 ap.add_argument('access_token_secret', help='Access token secret for the Twitter API')
+ap.add_argument('--cleaned_cache', help='(Optional) a file to keep the cleaned tweets by their content between runs')
+ap.add_argument('--tweets_db', help='(Optional) the tweet store to save the downloaded tweets in, and resume from '
+                                    'if the script re-starts (default: <resource_file>_tweets.db)')
+ap.add_argument('--workers', type=int, default=HYDRATION_WORKERS,
+                help='The maximal number of concurrent requests to the Twitter API (default: %(default)s)')
 args = ap.parse_args()
 
 import os
 import re
-import math
-import time
 import string
 import codecs
 import twitter
 import HTMLParser
 
+from collections import OrderedDict
+
 import logging
 logging.basicConfig(
     level=logging.INFO,
@@ -24,89 +32,108 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)  # pylint: disable=invalid-name
 logger.setLevel(logging.INFO)
 
-from spacy.en import English
 from common import camel_case_split
+from hydrator import Hydrator, NOT_AVAILABLE_ERROR
+from tweet_store import TweetStore
+from tweet_tokenizer import TweetTokenizer
 
 
 def main():
     """
     Download the tweets in the resource by their tweet IDs.
     """
-    nlp = English()
-    tweet_ids = set()
-    tweet_cache = {}
+    tokenizer = TweetTokenizer(clean_tokens, persistent_file=args.cleaned_cache)
 
-    api = twitter.Api(consumer_key=args.consumer_key, consumer_secret=args.consumer_secret,
-                      access_token_key=args.access_token, access_token_secret=args.access_token_secret)
+    # Save tweets in a store, in case the script stops working and re-starts
+    tweet_cache = TweetStore(args.tweets_db or os.path.basename(args.resource_file) + '_tweets.db')
 
-    [sleeptime, resettime] = reset_sleep_time(api)
+    # Save the downloaded tweets (and the cleaned tweets) also when the script stops with an error
+    try:
+        api = twitter.Api(consumer_key=args.consumer_key, consumer_secret=args.consumer_secret,
+                          access_token_key=args.access_token, access_token_secret=args.access_token_secret)
 
-    with codecs.open(os.path.basename(args.resource_file) + '_extended', 'w', 'utf-8') as f_out:
+        # The tweets we didn't download yet, each once
+        new_tweet_ids = OrderedDict()
         with codecs.open(args.resource_file, 'r', 'utf-8') as f_in:
             for line in f_in:
-                try:
+                for tweet_id in get_tweet_ids(line):
+                    if tweet_id not in new_tweet_ids and tweet_id not in tweet_cache:
+                        new_tweet_ids[tweet_id] = True
+
+        logger.info('Downloading {} tweets ({} were already downloaded)'.format(len(new_tweet_ids), len(tweet_cache)))
+
+        # Download up to 100 tweets in each request, with several requests in flight
+        for tweet_id, curr_tweet, error in Hydrator(api, args.workers).hydrate(new_tweet_ids.keys()):
+
+            if curr_tweet is not None:
+                tweet_cache[tweet_id] = clean_status(curr_tweet, tokenizer)
+                logger.info('\t'.join((tweet_id, tweet_cache[tweet_id])))
+
+            # The tweet is not available :(
+            elif error == NOT_AVAILABLE_ERROR:
+                logger.error('Error reading tweet id: {} : {}'.format(tweet_id, error))
+                tweet_cache[tweet_id] = None
+
+            # The request failed: don't save the tweet, so that the next run downloads it again
+            else:
+                logger.error('Error reading tweet id: {} : {} (will retry in the next run)'.format(tweet_id, error))
+
+        tweet_cache.commit()
+
+        with codecs.open(os.path.basename(args.resource_file) + '_extended', 'w', 'utf-8') as f_out:
+            with codecs.open(args.resource_file, 'r', 'utf-8') as f_in:
+                for line in f_in:
                     tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1, \
                     tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1 = \
                         line.strip().split('\t')
 
-                    tweet1, sleeptime, resettime = sent_by_tweet_id(
-                        tweet_ids, tweet_cache, api, sleeptime, resettime, nlp, tweet_id1)
-                    tweet2, sleeptime, resettime = sent_by_tweet_id(
-                        tweet_ids, tweet_cache, api, sleeptime, resettime, nlp, tweet_id2)
+                    # Tweets which failed to download are not in the store
+                    tweet1, tweet2 = tweet_cache.get(tweet_id1), tweet_cache.get(tweet_id2)
 
                     if tweet1 is not None and tweet2 is not None:
                         print >> f_out, '\t'.join((tweet_id1, tweet1, sf_pred1, pred1, sent1_a0, sent1_a1,
                                                    tweet_id2, tweet2, sf_pred2, pred2, sent2_a0, sent2_a1))
 
-                except twitter.TwitterError as err:
-                    if err.message == 'Rate limit exceeded':
-                        time.sleep(sleeptime * 10)
-
-
-def sent_by_tweet_id(tweet_ids, tweet_cache, api, sleeptime, resettime, nlp, tweet_id):
+        logger.info('Cleaned tweets cache: {}'.format(tokenizer.stats()))
+        logger.info('Twitter API requests: {}'.format(api.GetRequestStats()))
+        logger.info('Twitter API response cache: {}'.format(api.GetCacheStats()))
 
-    # We didn't download this tweet yet
-    if not tweet_id in tweet_ids:
-        try:
-            curr_tweet = api.GetStatus(tweet_id, include_entities=False)
-            tweet_text = re.sub('\n+', '. ', HTMLParser.HTMLParser().unescape(curr_tweet.text))
-            tweet_cache[tweet_id] = clean_tweet(' '.join([t.text for t in nlp(tweet_text)]),
-                                                set([hashtag.text for hashtag in curr_tweet.hashtags]),
-                                                set([url.url for url in curr_tweet.urls]),
-                                                { u.screen_name : u.name for u in curr_tweet.user_mentions })
-            logger.info('\t'.join((tweet_id, tweet_cache[tweet_id])))
-            time.sleep(sleeptime)
-            if time.time() >= resettime:
-                sleeptime, resettime = reset_sleep_time(api)
+    finally:
+        tokenizer.close()
+        tweet_cache.close()
 
-        except twitter.TwitterError as err:
-            error = str(err)
 
-            # If the rate limit exceeded, this script should be stopped and resumed the next day
-            if 'Rate limit exceeded' in error:
-                raise
+def get_tweet_ids(line):
+    """
+    Returns the tweet IDs of a resource line
+    :param line: the resource line
+    :return: the tweet IDs of the two propositions
+    """
+    instance = line.strip().split('\t')
+    return instance[0], instance[5]
 
-            # Other error - the tweet is not available :(
-            logger.error('Error reading tweet id: {} : {}'.format(tweet_id, error))
-            tweet_cache[tweet_id] = None
 
-    return tweet_cache[tweet_id], sleeptime, resettime
+def clean_status(curr_tweet, tokenizer):
+    """
+    Returns the cleaned text of a downloaded tweet
+    :param curr_tweet: the twitter.Status
+    :param tokenizer: the TweetTokenizer with clean_tokens
+    :return: the cleaned tweet
+    """
+    tweet_text = re.sub('\n+', '. ', HTMLParser.HTMLParser().unescape(curr_tweet.text))
+    return tokenizer.clean_tweet(tweet_text,
+                                 set([hashtag.text for hashtag in curr_tweet.hashtags]),
+                                 set([url.url for url in curr_tweet.urls]),
+                                 { u.screen_name : u.name for u in curr_tweet.user_mentions })
 
 
-def reset_sleep_time(api):
+def clean_tokens(tokens, hashtags, urls, user_mentions):
     """
-    Sleep between API requests (from: https://gist.github.com/emaadmanzoor)
-    :param api: twitter API
-    :return: the sleep time and reset time
+    Receives the spaCy tokens of a tweet and returns the cleaned tweet
+    :param tokens: the spaCy tokens of the original tweet
+    :return: the cleaned tweet
     """
-    rate_limit_stats = api.GetRateLimitStatus()
-    show_status_limits = rate_limit_stats['resources']['statuses']['/statuses/show/:id']
-    hits_remaining = show_status_limits['remaining']
-    reset_time = show_status_limits['reset']
-    div = hits_remaining if hits_remaining > 0 else 1
-    sleep_time = int(math.ceil((int(reset_time) - time.time()) * 1.0 / int(div)))
-    logger.info('Sleeping {} seconds between API hits until {}'.format(sleep_time, reset_time))
-    return sleep_time, reset_time
+    return clean_tweet(' '.join([t.text for t in tokens]), hashtags, urls, user_mentions)
 
 
 def clean_tweet(tweet, hashtags, urls, user_mentions):
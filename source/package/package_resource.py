@@ -1,4 +1,6 @@
+import os
 import codecs
+import cPickle as pickle
 
 from docopt import docopt
 from collections import Counter, defaultdict
@@ -11,36 +13,56 @@ def main():
 
     args = docopt("""Package the resource: get instances file and generate two files: instances and types.
 
-        Usage: package_resource.py <resource_file> <repository_dir>
+        Usage: package_resource.py [--state=<state_file>] <resource_file> <repository_dir>
 
         <resource_file>         The path for the resource.
         <repository_dir>        The github repository directory.
+        <state_file>            (Optional) incremental mode: the file that keeps the types counts and days
+                                between runs. Only the new days in the resource file are added to the resource,
+                                and their instances are appended to the instances file.
     """)
 
-    resource_file = args['<resource_file>']
-    repository_dir = args['<repository_dir>']
-
-    # Copy the instances file to the github directory
-    with codecs.open(resource_file, 'r', 'utf-8') as f_in:
+    # Load the instances
+    with codecs.open(args['<resource_file>'], 'r', 'utf-8') as f_in:
         resource = [tuple(line.strip().split('\t')) for line in f_in]
 
-    with codecs.open(repository_dir + '/instances.tsv', 'w', 'utf-8') as f_out:
+    package_resource(resource, args['<repository_dir>'], args['--state'])
+
+
+def package_resource(resource, repository_dir, state_file=None):
+    """
+    Write the instances and the types (rules) files of the resource
+    :param resource: the instances, each a tuple of date, tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1,
+    tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1
+    :param repository_dir: the directory of the instances.tsv and rules.tsv files
+    :param state_file: (optional) incremental mode: the file that keeps the types counts and days between runs
+    """
+    # Load the types counts and days of the previous runs
+    incremental = state_file is not None and os.path.exists(state_file)
+
+    if incremental:
+        types, types_by_date, days = load_state(state_file)
+    else:
+        types, types_by_date, days = Counter(), defaultdict(set), set()
+
+    # Don't add the same day twice
+    if incremental:
+        new_resource = [item for item in resource if item[0] not in days]
+        print 'Skipped %d instances from days that were already packaged' % (len(resource) - len(new_resource))
+        resource = new_resource
+
+    # Copy the instances file to the github directory
+    with codecs.open(repository_dir + '/instances.tsv', 'a' if incremental else 'w', 'utf-8') as f_out:
         for item in resource:
             print >> f_out, '\t'.join(item[1:])
 
     print 'Copied instances file'
 
     # Generate the types file
-    types = ['###'.join(sorted([pred1, pred2])) for (date, tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1,
-                                                     tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1) in resource]
-    types = Counter(types)
-
-    types_by_date = defaultdict(set)
-    [types_by_date['###'.join(sorted([pred1, pred2]))].add(date)
-     for (date, tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1, tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1) in resource]
+    update_types(resource, types, types_by_date, days)
 
     # Give more importance to rules that occurred in more than one day
-    number_of_days = len(set([v for k, values in types_by_date.iteritems() for v in values]))
+    number_of_days = len(days)
     types_with_scores = [(key, count * (1 + len(types_by_date[key]) * 1.0 / number_of_days))
                          for key, count in types.most_common()]
     types_with_scores = sorted(types_with_scores, key=lambda x: x[1], reverse=True)
@@ -52,6 +74,53 @@ def main():
 
     print 'Copied types file'
 
+    if state_file is not None:
+        save_state(state_file, types, types_by_date, days)
+
+
+def update_types(resource, types, types_by_date, days):
+    """
+    Add the instances of the resource to the types counts and days
+    :param resource: the instances
+    :param types: the number of instances of each type (p1###p2)
+    :param types_by_date: the days in which each type occurred
+    :param days: all the days in the resource
+    """
+    types.update(['###'.join(sorted([pred1, pred2])) for (date, tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1,
+                                                          tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1) in resource])
+
+    [types_by_date['###'.join(sorted([pred1, pred2]))].add(date)
+     for (date, tweet_id1, sf_pred1, pred1, sent1_a0, sent1_a1, tweet_id2, sf_pred2, pred2, sent2_a0, sent2_a1) in resource]
+
+    days.update([item[0] for item in resource])
+
+
+def load_state(state_file):
+    """
+    Load the types counts and days of the previous runs
+    :param state_file: the state file
+    :return: the types counts, the days of each type and all the days
+    """
+    with open(state_file, 'rb') as f_in:
+        types, types_by_date, days = pickle.load(f_in)
+
+    return types, types_by_date, days
+
+
+def save_state(state_file, types, types_by_date, days):
+    """
+    Save the types counts and days for the next runs. The previous state is replaced only after the new one
+    was written completely.
+    :param state_file: the state file
+    :param types: the number of instances of each type (p1###p2)
+    :param types_by_date: the days in which each type occurred
+    :param days: all the days in the resource
+    """
+    with open(state_file + '.tmp', 'wb') as f_out:
+        pickle.dump((types, types_by_date, days), f_out, pickle.HIGHEST_PROTOCOL)
+
+    os.rename(state_file + '.tmp', state_file)
+
 
 if __name__ == '__main__':
     main()
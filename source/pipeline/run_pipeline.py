@@ -0,0 +1,292 @@
+"""
+Usage:
+    run_pipeline --out=REPOSITORY_DIR [--state=STATE_FILE] [--workers=WORKERS] [--batch-size=BATCH_SIZE]
+                 [--queue-size=QUEUE_SIZE] [--props-dir=PROPS_DIR] [--positive-dir=POSITIVE_DIR]
+                 [--pronouns=PRONOUNS_FILE] [--fast_language_filter] TWEETS_FILE...
+
+Run the daily steps on tweets files (e.g. the days collected by get_news_tweets_stream) as a pipeline of stages
+connected by bounded queues, instead of one script after the other:
+1. extraction: the propositions of each file are extracted by the worker processes (as in prop_extraction)
+2. alignment: the propositions are aligned while they are extracted (as in get_corefering_predicates)
+3. packaging: with --state, the positive instances of each file are added to the resource once they are complete
+   (as in package_resource --state). Otherwise, the instances of all the files are packaged together at the end
+   (as in package_resource on the concatenated positive instances files).
+Each stage also writes its files as the scripts do: PROPS_DIR/<name>.prop, POSITIVE_DIR/<name>, and the
+instances.tsv and rules.tsv files in REPOSITORY_DIR. The time each stage spent working and waiting for the
+other stages is logged at the end.
+
+Options:
+   --out=REPOSITORY_DIR          The directory of instances.tsv and rules.tsv
+   --state=STATE_FILE            The file that keeps the types counts and days between runs (see package_resource)
+   --workers=WORKERS             The number of extraction processes, each loading its own spaCy model [default: 1]
+   --batch-size=BATCH_SIZE       The number of sentences to parse together with spaCy's pipe [default: 1]
+   --queue-size=QUEUE_SIZE       The maximal number of chunks waiting between two stages [default: 10]
+   --props-dir=PROPS_DIR         The directory of the propositions files [default: news_stream/props]
+   --positive-dir=POSITIVE_DIR   The directory of the positive instances files [default: news_stream/positive]
+   --pronouns=PRONOUNS_FILE      The list of pronouns, as in get_corefering_predicates [default: pronouns.txt]
+   --fast_language_filter        Identify obviously English / non English sentences without guessLanguage
+"""
+import os
+import sys
+import time
+import Queue
+import codecs
+import logging
+import itertools
+import threading
+
+sys.path.append('../')
+sys.path.extend(['../proposition_extraction', '../generate_instances', '../package'])
+
+from docopt import docopt
+from collections import deque
+from multiprocessing import Pool
+from prop_extraction import init_worker, extract_chunk, write_extractions, open_input, path_leaf, report_stats, \
+    LINES_PER_CHUNK, PENDING_CHUNKS_PER_WORKER
+from extraction_stats import ExtractionStats
+from get_corefering_predicates import IncrementalAligner, LanguageFilter, parse_proposition, filter_instances, \
+    write_instances
+from package_resource import package_resource
+
+# The columns of the positive instances kept in the resource (without the tweets, to comply with Twitter policy)
+RESOURCE_COLUMNS = [0, 1, 3, 4, 5, 6, 7, 9, 10, 11, 12]
+
+# Marks the end of the input of a stage
+END = None
+
+
+def main():
+
+    args = docopt(__doc__)
+    workers = int(args['--workers'])
+    queue_size = int(args['--queue-size'])
+
+    with codecs.open(args['--pronouns'], 'r', 'utf-8') as f_in:
+        pronouns = set([line.strip() for line in f_in])
+
+    logging.info('Loading spaCy in {} worker processes...'.format(workers))
+    pool = Pool(workers, init_worker, (int(args['--batch-size']),))
+
+    # Extraction -> (tweets file, propositions file, output lines) -> alignment -> (tweets file, instances) -> packaging
+    propositions_queue = Queue.Queue(queue_size)
+    instances_queue = Queue.Queue(queue_size)
+
+    stages = [Stage('extraction', extract_files, None, propositions_queue,
+                    args['TWEETS_FILE'], args['--props-dir'], pool, workers),
+              Stage('alignment', align_files, propositions_queue, instances_queue,
+                    args['--positive-dir'], pronouns, args['--fast_language_filter']),
+              Stage('packaging', package_files, instances_queue, None,
+                    args['--out'], args['--state'])]
+
+    start = time.time()
+    [stage.start() for stage in stages]
+    [stage.join() for stage in stages]
+    pool.close()
+    pool.join()
+
+    logging.info('Done in {:.2f} seconds'.format(time.time() - start))
+    [logging.info(stage.summary()) for stage in stages]
+
+    errors = [stage.error for stage in stages if stage.error is not None]
+
+    if len(errors) > 0:
+        raise errors[0]
+
+
+class Stage(threading.Thread):
+    """
+    A stage of the pipeline, running in its own thread. It reads items from its input queue until END,
+    and puts items in its output queue followed by END. The time spent waiting for the input and output queues
+    (i.e. for the other stages) is measured separately from the time spent working.
+    """
+    def __init__(self, name, run_stage, inbox, outbox, *args):
+        """
+        Initialize the stage
+        :param name: the stage name
+        :param run_stage: a function that receives the stage and the args, and runs it
+        :param inbox: the input queue (None for the first stage)
+        :param outbox: the output queue (None for the last stage)
+        :param args: additional arguments of run_stage
+        """
+        threading.Thread.__init__(self, name=name)
+        self.run_stage = run_stage
+        self.inbox = inbox
+        self.outbox = outbox
+        self.args = args
+        self.error = None
+        self.input_done = False
+        self.items_read = self.items_written = 0
+        self.start_time = self.end_time = None
+        self.input_wait = self.output_wait = 0.0
+
+    def run(self):
+        self.start_time = time.time()
+
+        try:
+            self.run_stage(self, *self.args)
+
+        except Exception as e:
+            logging.exception('The {} stage failed'.format(self.name))
+            self.error = e
+
+            # Let the previous stage finish
+            while self.inbox is not None and not self.input_done:
+                self.get()
+
+        if self.outbox is not None:
+            self.put(END)
+
+        self.end_time = time.time()
+
+    def get(self):
+        """
+        Returns the next input item, waiting for the previous stage
+        :return: the next input item, or END
+        """
+        start = time.time()
+        item = self.inbox.get()
+        self.input_wait += time.time() - start
+        self.items_read += item is not END
+        self.input_done = item is END
+        return item
+
+    def items_in(self):
+        """
+        Returns the input items
+        :return: a generator of the input items, until END
+        """
+        return iter(self.get, END)
+
+    def put(self, item):
+        """
+        Put an item in the output queue, waiting for the next stage if it is full
+        :param item: the item
+        """
+        start = time.time()
+        self.outbox.put(item)
+        self.output_wait += time.time() - start
+        self.items_written += item is not END
+
+    def summary(self):
+        """
+        Returns a textual summary of the stage timings
+        :return: a textual summary of the stage timings
+        """
+        total = self.end_time - self.start_time
+        return '{}: {:.2f} seconds, {:.2f} working, {:.2f} waiting for input, {:.2f} waiting for output, ' \
+               '{} items in, {} items out'.format(self.name, total, total - self.input_wait - self.output_wait,
+                                                  self.input_wait, self.output_wait, self.items_read,
+                                                  self.items_written)
+
+
+def extract_files(stage, tweets_files, props_dir, pool, workers):
+    """
+    Extract the propositions of each tweets file in chunks of lines, by the worker processes. The output lines
+    of each chunk are written to the propositions file and sent to the next stage in the original order.
+    :param stage: the extraction Stage
+    :param tweets_files: the tweets files
+    :param props_dir: the directory of the propositions files
+    :param pool: a pool of worker processes, initialized with prop_extraction.init_worker
+    :param workers: the number of worker processes
+    """
+    for tweets_file in tweets_files:
+        prop_file = os.path.join(props_dir, path_leaf(tweets_file).replace('.gz', '') + '.prop')
+        logging.info('Extracting propositions from {} to {}'.format(tweets_file, prop_file))
+        stats = ExtractionStats()
+
+        with open_input(tweets_file) as f_in:
+            chunks = iter(lambda: list(itertools.islice(f_in, LINES_PER_CHUNK)), [])
+            pending = deque()
+
+            with codecs.open(prop_file, 'w', 'utf-8') as f_out:
+                for chunk in itertools.chain(chunks, [END]):
+
+                    if chunk is not END:
+                        pending.append(pool.apply_async(extract_chunk, (chunk,)))
+
+                    # Read the results of the oldest chunks, to keep the input order
+                    while len(pending) >= workers * PENDING_CHUNKS_PER_WORKER or (chunk is END and len(pending) > 0):
+                        chunk_out_lines, chunk_stats = pending.popleft().get()
+                        stats.merge(chunk_stats)
+                        out_lines = [line for sent_out_lines in chunk_out_lines for line in sent_out_lines]
+                        write_extractions(f_out, out_lines)
+                        stage.put((tweets_file, prop_file, out_lines))
+
+        report_stats(stats, prop_file)
+
+        # The end of the file
+        stage.put((tweets_file, prop_file, END))
+
+
+def align_files(stage, positive_dir, pronouns, fast_language_filter):
+    """
+    Align the propositions of each file while they are extracted, and send the instances of each complete file
+    to the next stage
+    :param stage: the alignment Stage
+    :param positive_dir: the directory of the positive instances files
+    :param pronouns: a set of pronouns, propositions with a pronoun argument are removed
+    :param fast_language_filter: whether to identify obviously English / non English sentences without guessLanguage
+    """
+    aligner = language_filter = None
+
+    for tweets_file, prop_file, out_lines in stage.items_in():
+
+        if aligner is None:
+            aligner, language_filter = IncrementalAligner(pronouns), LanguageFilter(fast_language_filter)
+
+        if out_lines is not END:
+
+            # The lines as they are read from the propositions file
+            for line in itertools.chain(*[(out_line + '\n').splitlines(True) for out_line in out_lines]):
+                prop = parse_proposition(line, language_filter)
+                if prop is not None:
+                    aligner.add(prop)
+
+            continue
+
+        filtered = filter_instances(aligner.finish())
+        logging.info('Extracted {} instances from {}'.format(len(filtered), prop_file))
+        positive_file = os.path.join(positive_dir, path_leaf(prop_file))
+        lines = write_instances(filtered, prop_file, positive_file)
+        stage.put((tweets_file, [resource_instance(line) for line in lines]))
+        aligner = language_filter = None
+
+
+def package_files(stage, repository_dir, state_file):
+    """
+    Add the instances of each complete file to the resource. Without a state file, each call to package_resource
+    would replace the resource with the instances of a single file, so the instances of all the files are
+    packaged together after the last one.
+    :param stage: the packaging Stage
+    :param repository_dir: the directory of the instances.tsv and rules.tsv files
+    :param state_file: the file that keeps the types counts and days between runs (None to package all the files
+    together)
+    """
+    all_resource = []
+
+    for tweets_file, resource in stage.items_in():
+        if state_file is None:
+            all_resource.extend(resource)
+            continue
+
+        logging.info('Packaging {} instances from {}'.format(len(resource), tweets_file))
+        package_resource(resource, repository_dir, state_file)
+
+    if state_file is None:
+        logging.info('Packaging {} instances'.format(len(all_resource)))
+        package_resource(all_resource, repository_dir)
+
+
+def resource_instance(line):
+    """
+    Returns the resource instance of a positive instance line, as read from the output of
+    cut -f1,2,4,5,6,7,8,10,11,12,13,14 by package_resource
+    :param line: the positive instance line
+    :return: the resource instance
+    """
+    columns = line.split('\t')
+    return tuple('\t'.join([columns[i] for i in RESOURCE_COLUMNS if i < len(columns)]).strip().split('\t'))
+
+
+if __name__ == '__main__':
+    main()
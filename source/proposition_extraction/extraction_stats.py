@@ -0,0 +1,142 @@
+"""
+Per-sentence timing and failure accounting for the proposition extraction.
+"""
+import heapq
+import codecs
+
+from array import array
+from collections import Counter
+
+# The phases of processing a sentence
+PHASES = ['parse', 'chunk', 'extract']
+
+# The number of failing sentences to keep for the profile file
+MAX_FAILED_SENTENCES = 1000
+
+
+class ExtractionStats:
+    """
+    Records the time of each phase (parse, chunk, extract) for each sentence, and the sentences that failed
+    """
+    def __init__(self, num_slowest = 10):
+        """
+        Initialize empty statistics
+        :param num_slowest: the number of slowest sentences to keep
+        """
+        self.num_slowest = num_slowest
+        self.times = dict([(phase, array('d')) for phase in PHASES])
+        self.total_times = array('d')
+        self.failures = Counter()
+        self.failed_batches = Counter()
+        self.failed_sentences = []
+        self.slowest = []
+
+    def add(self, sent, times, failed_phase = None, error = None):
+        """
+        Record the processing of a single sentence
+        :param sent: the sentence
+        :param times: the time of each phase, for the phases that were started
+        :param failed_phase: the phase that failed (None if the sentence didn't fail)
+        :param error: the exception raised in the failed phase
+        """
+        times = list(times) + [0.0] * (len(PHASES) - len(times))
+
+        for phase, phase_time in zip(PHASES, times):
+            self.times[phase].append(phase_time)
+
+        total_time = sum(times)
+        self.total_times.append(total_time)
+
+        # Keep the slowest sentences in a min-heap
+        if len(self.slowest) < self.num_slowest:
+            heapq.heappush(self.slowest, (total_time, sent))
+        elif total_time > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (total_time, sent))
+
+        if failed_phase is not None:
+            error_type = type(error).__name__
+            self.failures[(failed_phase, error_type)] += 1
+
+            if len(self.failed_sentences) < MAX_FAILED_SENTENCES:
+                self.failed_sentences.append((failed_phase, error_type, str(error), sent))
+
+    def add_failed_batch(self, error):
+        """
+        Record a batch of sentences whose parse failed (its sentences are then parsed one at a time)
+        :param error: the exception raised by the batch parse
+        """
+        self.failed_batches[type(error).__name__] += 1
+
+    def merge(self, other):
+        """
+        Add the statistics recorded by another object (e.g. in a worker process)
+        :param other: the other ExtractionStats
+        """
+        for phase in PHASES:
+            self.times[phase].extend(other.times[phase])
+
+        self.total_times.extend(other.total_times)
+        self.failures.update(other.failures)
+        self.failed_batches.update(other.failed_batches)
+        self.failed_sentences.extend(other.failed_sentences[:MAX_FAILED_SENTENCES - len(self.failed_sentences)])
+        self.slowest = heapq.nlargest(self.num_slowest, self.slowest + other.slowest)
+        heapq.heapify(self.slowest)
+
+    def summary(self):
+        """
+        Returns a textual summary of the statistics: latency percentiles, failures and slowest sentences
+        :return: a textual summary of the statistics
+        """
+        lines = ['Sentences: {} \t Failed: {}'.format(len(self.total_times), sum(self.failures.values()))]
+
+        for phase, times in [(phase, self.times[phase]) for phase in PHASES] + [('total', self.total_times)]:
+            p50, p95, p99 = [percentile(times, p) * 1000 for p in [50, 95, 99]]
+            lines.append('{}: p50={:.2f}ms \t p95={:.2f}ms \t p99={:.2f}ms \t sum={:.2f}s'.
+                         format(phase, p50, p95, p99, sum(times)))
+
+        for (phase, error_type), count in self.failures.most_common():
+            lines.append('Failed in {} with {}: {}'.format(phase, error_type, count))
+
+        for error_type, count in self.failed_batches.most_common():
+            lines.append('Failed batch parse with {} (parsed one sentence at a time): {}'.format(error_type, count))
+
+        for total_time, sent in sorted(self.slowest, reverse = True):
+            lines.append('Slow sentence ({:.2f}ms): {}'.format(total_time * 1000, sent))
+
+        return '\n'.join(lines)
+
+    def dump(self, fn):
+        """
+        Write the slowest and failing sentences to a file, for profiling
+        :param fn: the file name
+        """
+        with codecs.open(fn, 'w', 'utf-8') as f_out:
+            for total_time, sent in sorted(self.slowest, reverse = True):
+                f_out.write(u'\t'.join(['slow', '{:.6f}'.format(total_time), to_unicode(sent)]) + '\n')
+
+            for phase, error_type, message, sent in self.failed_sentences:
+                f_out.write(u'\t'.join(['failed', phase, error_type, to_unicode(message).replace('\n', ' '),
+                                        to_unicode(sent)]) + '\n')
+
+
+def percentile(values, p):
+    """
+    Returns the p-th percentile of the values (nearest rank)
+    :param values: the values
+    :param p: the percentile, between 0 and 100
+    :return: the p-th percentile of the values (0 if there are no values)
+    """
+    if len(values) == 0:
+        return 0.0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def to_unicode(s):
+    """
+    Convert a (possibly byte) string to unicode, ignoring errors
+    :param s: the string
+    :return: the unicode string
+    """
+    return s if isinstance(s, unicode) else unicode(s, errors = 'ignore')
@@ -2,57 +2,120 @@
 author: Gabi Stanovsky
 
 Usage:
-    prop_extraction --in=INPUT_FILE --out=OUTPUT_FILE
+    prop_extraction --in=INPUT_FILE --out=OUTPUT_FILE [--batch-size=BATCH_SIZE] [--workers=WORKERS]
+                    [--profile] [--follow] [--poll-interval=POLL_INTERVAL]
 
 Extract propositions from a given input file, output is produced in separate output file.
 If both in and out paramaters are directories, the script will iterate over all *.txt files in the input directory and
 output to *.prop files in output directory.
+Input files ending with .gz (e.g. compressed segments written by get_news_tweets_stream) are decompressed on the fly.
+In follow mode, a single uncompressed input file (.gz files are rejected) is processed while it is being written by
+get_news_tweets_stream, and the extractions are appended to the output file as new lines arrive, until the file is
+complete.
+With more than one worker, the input files are split between the worker processes (in directory mode),
+or a single input file is split to chunks of lines which are processed by the workers and merged in the original order.
 
 Options:
    --in=INPUT_FILE    The input file, each sentence in a separate line
    --out=OUTPUT_FILE  The output file, Each extraction in a tab separated line, each consisting of original sentence,
    predicate template, lemmatized predicate template,argument name, argument value, ...
+   --batch-size=BATCH_SIZE  The number of sentences to parse together with spaCy's pipe. 1 parses each sentence
+   separately [default: 1]
+   --workers=WORKERS  The number of worker processes, each loading its own spaCy model [default: 1]
+   --profile          Write the slowest and failing sentences of each input file to OUTPUT_FILE.profile
+   --follow           Follow the input file while it is written (as INPUT_FILE.part, until it is renamed to
+   INPUT_FILE). The processed offsets are saved in OUTPUT_FILE.checkpoint, and a restarted run continues from them.
+   --poll-interval=POLL_INTERVAL  The time in seconds to wait for new lines in follow mode [default: 10]
 """
 import os
 import sys
+import gzip
+import time
 import ntpath
+import itertools
 import codecs
 import logging
 
 sys.path.append('../')
 
 from glob import glob
+from collections import deque
 from docopt import docopt
+from multiprocessing import Pool
 from spacy_wrapper import spacy_wrapper
+from extraction_stats import ExtractionStats
 
 
 logging.basicConfig(level = logging.INFO)
 
+# The number of lines in each chunk of a single input file sent to a worker process
+LINES_PER_CHUNK = 5000
+
+# The number of chunks submitted to each worker process ahead of the one being written, so that the input file
+# is read as the chunks are processed rather than all at once
+PENDING_CHUNKS_PER_WORKER = 2
+
+# The suffix of a tweets file which is still being written by get_news_tweets_stream
+PARTIAL_SUFFIX = '.part'
+
+# The proposition extraction object, batch size and profile flag of the current worker process, set by init_worker
+worker_prop_ex = None
+worker_batch_size = 1
+worker_profile = False
+
 
 def main():
 
     args = docopt(__doc__)
     inp = args['--in']
     out = args['--out']
-    logging.info("Loading spaCy...")
-    pe = prop_extraction()
+    batch_size = int(args['--batch-size'])
+    workers = int(args['--workers'])
+    profile = args['--profile']
+
+    # Each worker process loads its own model
+    if workers > 1:
+        logging.info("Loading spaCy in {} worker processes...".format(workers))
+        pool = Pool(workers, init_worker, (batch_size, profile))
+    else:
+        logging.info("Loading spaCy...")
+        pe = prop_extraction()
 
     # Differentiate between single input file and directories
     if os.path.isdir(inp):
         logging.debug('Running on directories:')
         num_of_lines = num_of_extractions = 0
 
-        for input_fn in glob(os.path.join(inp, '*.txt')):
-            output_fn = os.path.join(out, path_leaf(input_fn).replace('.txt', '.prop'))
-            logging.debug('input file: {}\noutput file:{}'.format(input_fn, output_fn))
+        file_pairs = [(input_fn, os.path.join(out, path_leaf(input_fn).replace('.txt', '.prop').replace('.gz', '')))
+                      for input_fn in glob(os.path.join(inp, '*.txt')) + glob(os.path.join(inp, '*.txt.gz'))]
+
+        if workers > 1:
+            counters = pool.imap(run_single_file_worker, file_pairs)
+        else:
+            counters = (run_single_file(input_fn, output_fn, pe, batch_size, profile)
+                        for input_fn, output_fn in file_pairs)
 
-            cur_line_counter, cur_extractions_counter = run_single_file(input_fn, output_fn, pe)
+        for (input_fn, output_fn), (cur_line_counter, cur_extractions_counter) in itertools.izip(file_pairs, counters):
+            logging.debug('input file: {}\noutput file:{}'.format(input_fn, output_fn))
             num_of_lines += cur_line_counter
             num_of_extractions += cur_extractions_counter
 
+    elif args['--follow']:
+        logging.debug('Following a single file:')
+        num_of_lines, num_of_extractions = run_single_file_follow(inp, out, pe if workers == 1 else None,
+                                                                  pool if workers > 1 else None, workers, batch_size,
+                                                                  float(args['--poll-interval']), profile)
+
     else:
         logging.debug('Running on single files:')
-        num_of_lines, num_of_extractions = run_single_file(inp, out, pe)
+        if workers > 1:
+            num_of_lines, num_of_extractions = run_single_file_parallel(inp, out, pool, workers, profile)
+        else:
+            num_of_lines, num_of_extractions = run_single_file(inp, out, pe, batch_size, profile)
+
+    if workers > 1:
+        pool.close()
+        pool.join()
 
     logging.info('# Sentences: {} \t #Extractions: {} \t Extractions/sentence Ratio: {}'.
                  format(num_of_lines, num_of_extractions, float(num_of_extractions) / num_of_lines))
@@ -67,6 +130,7 @@ class prop_extraction:
         Initalize internal parser
         """
         self.parser = spacy_wrapper()
+        self.stats = ExtractionStats()
 
     def get_extractions(self, sent):
         """
@@ -74,67 +138,139 @@ class prop_extraction:
         :param sent: the sentence
         :return A list of strings, each representing a single proposition.
         """
-        ret = []
+        start = time.time()
 
         try:
             self.parser.parse(sent)
+        except Exception as e:
+            self.stats.add(sent, [time.time() - start], 'parse', e)
+            return []
+
+        return self.get_current_extractions(sent, time.time() - start)
+
+    def get_extractions_batch(self, sents, batch_size = 1000):
+        """
+        Given a stream of sentences, get the propositions of each of them.
+        The sentences are parsed in batches using spaCy's pipe. If parsing a batch fails, the failure is recorded
+        and the sentences of the batch are parsed again one at a time, so that only the failing sentences are lost.
+        :param sents: an iterable of sentences
+        :param batch_size: the number of sentences to parse in each batch
+        :return A generator of lists of strings (as in get_extractions), one for each sentence, in the input order.
+        """
+        sents = iter(sents)
+
+        while True:
+            batch = list(itertools.islice(sents, batch_size))
+
+            if len(batch) == 0:
+                break
+
+            start = time.time()
+
+            try:
+                docs = list(self.parser.pipe(batch, batch_size))
+            except Exception as e:
+                self.stats.add_failed_batch(e)
+
+                for sent in batch:
+                    yield self.get_extractions(sent)
+
+                continue
+
+            # The parse time of a sentence is its share of the batch parse
+            parse_time = (time.time() - start) / len(batch)
+
+            for sent, doc in itertools.izip(batch, docs):
+                self.parser.set_doc(doc)
+                yield self.get_current_extractions(sent, parse_time)
+
+    def get_current_extractions(self, sent = None, parse_time = 0.0):
+        """
+        Get all the propositions of the sentence currently set in the parser, and record the time of each phase.
+        If the chunking or extraction fail, the failure is recorded and the propositions found so far are returned.
+        :param sent: the sentence, for the statistics
+        :param parse_time: the time it took to parse the sentence
+        :return A list of strings, each representing a single proposition.
+        """
+        ret = []
+        times = [parse_time]
+        phase = 'chunk'
+        start = time.time()
+
+        try:
             self.parser.chunk()
 
-            for verb in [i for i in range(self.parser.get_len()) if self.parser.is_verb(i)]:
+            times.append(time.time() - start)
+            phase = 'extract'
+            start = time.time()
 
-                # Extract the proposition from this predicate
-                extraction = Extraction()
+            self.extract(self.parser, ret)
 
-                # For each child, decide if and how to include it in the template
-                for child in self.parser.get_children(verb):
+        except Exception as e:
+            times.append(time.time() - start)
+            self.stats.add(sent, times, phase, e)
+            return ret
 
-                    curr_arg = child
+        times.append(time.time() - start)
+        self.stats.add(sent, times)
+        return ret
 
-                    # Find if this is the right spot to plug the verb in the template
-                    if curr_arg > verb and not extraction.pred_exists:
-                        extraction.set_predicate(self.parser.get_text(verb), self.parser.get_lemma(verb))
+    def extract(self, parser, ret):
+        """
+        Extract the propositions of a chunked sentence
+        :param parser: the spacy_wrapper, with the parsed and chunked sentence
+        :param ret: the list to add the propositions to, each as a string
+        """
+        for verb in [i for i in range(parser.get_len()) if parser.is_verb(i)]:
 
-                    # Add non-consecutive particles to predicate
-                    if self.parser.is_part_of_non_consecutive_span(verb, curr_arg):
-                        extraction.add_prt_to_predicate(self.parser.get_text(curr_arg),
-                                                        self.parser.get_lemma(curr_arg))
+            # Extract the proposition from this predicate
+            extraction = Extraction()
 
-                    # Datives and prepositions are deferred if they have one exactly one pobj
-                    if self.parser.is_dative(curr_arg) or self.parser.is_prep(curr_arg):
+            # For each child, decide if and how to include it in the template
+            for child in parser.get_children(verb):
 
-                        pobjs = self.parser.get_single_pobj(curr_arg)
+                curr_arg = child
 
-                        if pobjs:
+                # Find if this is the right spot to plug the verb in the template
+                if curr_arg > verb and not extraction.pred_exists:
+                    extraction.set_predicate(parser.get_text(verb), parser.get_lemma(verb))
 
-                            # Sanity check
-                            assert(len(pobjs)) == 1
-                            pobj = pobjs[0]
+                # Add non-consecutive particles to predicate
+                if parser.is_part_of_non_consecutive_span(verb, curr_arg):
+                    extraction.add_prt_to_predicate(parser.get_text(curr_arg),
+                                                    parser.get_lemma(curr_arg))
 
-                            # Plug prep/dative in template and signal that pobj should be added to roles_dict
-                            # note - we do not lemmatize the datives and pp's
-                            extraction.template += "{} ".format(self.parser.get_text(curr_arg))
-                            curr_arg = pobj
+                # Datives and prepositions are deferred if they have one exactly one pobj
+                if parser.is_dative(curr_arg) or parser.is_prep(curr_arg):
 
-                    # Subject and objects are plugged directly
-                    if self.parser.is_subj(curr_arg):
+                    pobjs = parser.get_single_pobj(curr_arg)
 
-                        # Replace pronoun with head of a relative clause
-                        if self.parser.is_rel_clause(verb) and self.parser.is_pronoun(curr_arg):
-                            extraction.add_argument(self.parser.get_text(self.parser.get_head(verb)))
-                        else:
-                            extraction.add_argument(self.parser.get_text(curr_arg))
+                    if pobjs:
 
-                    if self.parser.is_obj(curr_arg):
-                        extraction.add_argument(self.parser.get_text(curr_arg))
+                        # Sanity check
+                        assert(len(pobjs)) == 1
+                        pobj = pobjs[0]
 
-                # Record extractions with at least 2 arguments
-                if len(extraction.args) > 1 and extraction.pred_exists:
-                    ret.append(str(extraction))
+                        # Plug prep/dative in template and signal that pobj should be added to roles_dict
+                        # note - we do not lemmatize the datives and pp's
+                        extraction.template += "{} ".format(parser.get_text(curr_arg))
+                        curr_arg = pobj
 
-        except:
-            pass
+                # Subject and objects are plugged directly
+                if parser.is_subj(curr_arg):
 
-        return ret
+                    # Replace pronoun with head of a relative clause
+                    if parser.is_rel_clause(verb) and parser.is_pronoun(curr_arg):
+                        extraction.add_argument(parser.get_text(parser.get_head(verb)))
+                    else:
+                        extraction.add_argument(parser.get_text(curr_arg))
+
+                if parser.is_obj(curr_arg):
+                    extraction.add_argument(parser.get_text(curr_arg))
+
+            # Record extractions with at least 2 arguments
+            if len(extraction.args) > 1 and extraction.pred_exists:
+                ret.append(str(extraction))
 
 
 class Extraction:
@@ -194,43 +330,336 @@ class Extraction:
         return ret
 
 
-def run_single_file(input_fn, output_fn, prop_ex):
+def run_single_file(input_fn, output_fn, prop_ex, batch_size = 1, profile = False):
     """
     Process extractions from a single input file and print to an output file,
     using a proposition extraction module.
     :param input_fn: the input file name
     :param output_fn: the output file name
     :param prop_ex: the proposition extraction object
+    :param batch_size: the number of sentences to parse together (1 parses each sentence separately)
+    :param profile: whether to write the slowest and failing sentences to output_fn.profile
     :return (#lines, #num of extractions)
     """
     logging.info('Reading sentences from {}'.format(input_fn))
     ex_counter = 0
     line_counter = 0
+    prop_ex.stats = ExtractionStats()
 
     with codecs.open(output_fn, 'w', 'utf-8') as f_out:
-        for line in open(input_fn):
+        for out_lines in extract_records(read_sentences(open_input(input_fn)), prop_ex, batch_size):
             line_counter += 1
-            data = line.strip().split('\t')
-            tweet_id = None
-            if len(data) == 2:
-                tweet_id, sent = data
-            elif len(data) == 4:
-                date, tweet_id, user, sent = data
+            ex_counter += write_extractions(f_out, out_lines)
+
+    logging.info('Done! Wrote {} extractions to {}'.format(ex_counter, output_fn))
+    report_stats(prop_ex.stats, output_fn, profile)
+    return line_counter, ex_counter
+
+
+def run_single_file_parallel(input_fn, output_fn, pool, workers, profile = False):
+    """
+    Process extractions from a single input file and print to an output file, splitting the file to chunks of lines
+    which are processed by the worker processes. The output is written in the original line order.
+    :param input_fn: the input file name
+    :param output_fn: the output file name
+    :param pool: a pool of worker processes, initialized with init_worker
+    :param workers: the number of worker processes in the pool
+    :param profile: whether to write the slowest and failing sentences to output_fn.profile
+    :return (#lines, #num of extractions)
+    """
+    logging.info('Reading sentences from {}'.format(input_fn))
+    ex_counter = 0
+    line_counter = 0
+    stats = ExtractionStats()
+
+    with open_input(input_fn) as f_in:
+        chunks = iter(lambda: list(itertools.islice(f_in, LINES_PER_CHUNK)), [])
+        pending = deque()
+
+        with codecs.open(output_fn, 'w', 'utf-8') as f_out:
+            for chunk in itertools.chain(chunks, [None]):
+
+                if chunk is not None:
+                    pending.append(pool.apply_async(extract_chunk, (chunk,)))
+
+                # Read the results of the oldest chunks, to keep the input order
+                while len(pending) >= workers * PENDING_CHUNKS_PER_WORKER or (chunk is None and len(pending) > 0):
+                    chunk_out_lines, chunk_stats = pending.popleft().get()
+                    stats.merge(chunk_stats)
+
+                    for out_lines in chunk_out_lines:
+                        line_counter += 1
+                        ex_counter += write_extractions(f_out, out_lines)
+
+    logging.info('Done! Wrote {} extractions to {}'.format(ex_counter, output_fn))
+    report_stats(stats, output_fn, profile)
+    return line_counter, ex_counter
+
+
+def run_single_file_follow(input_fn, output_fn, prop_ex = None, pool = None, workers = 1, batch_size = 1,
+                           poll_interval = 10.0, profile = False):
+    """
+    Process extractions from a single input file while it is being written, and append them to an output file.
+    The file is read from input_fn.part until it is complete and renamed to input_fn (or from input_fn if it is
+    complete). After each batch of new lines, the input and output offsets are saved to output_fn.checkpoint,
+    so a restarted run continues from the last checkpoint (the extractions written after it are discarded).
+    :param input_fn: the input file name
+    :param output_fn: the output file name
+    :param prop_ex: the proposition extraction object (None to use the pool)
+    :param pool: a pool of worker processes, initialized with init_worker (None to use prop_ex)
+    :param workers: the number of worker processes in the pool
+    :param batch_size: the number of sentences to parse together (1 parses each sentence separately)
+    :param poll_interval: the time in seconds to wait for new lines
+    :param profile: whether to write the slowest and failing sentences to output_fn.profile
+    :return (#lines, #num of extractions)
+    """
+    # The offsets of a growing compressed file can't be followed, and its compressed bytes would be parsed as lines
+    if input_fn.endswith('.gz'):
+        raise ValueError('Can\'t follow the compressed file {}: follow mode requires an uncompressed stream '
+                         '(get_news_tweets_stream without --compress)'.format(input_fn))
+
+    checkpoint_fn = output_fn + '.checkpoint'
+    input_offset, output_offset = load_checkpoint(checkpoint_fn)
+    logging.info('Following {} from offset {}'.format(input_fn, input_offset))
+    ex_counter = 0
+    line_counter = 0
+    stats = ExtractionStats()
+
+    if prop_ex is not None:
+        prop_ex.stats = stats
+
+    f_in = open_growing_file(input_fn, poll_interval)
+    f_in.seek(input_offset)
+
+    # Discard the extractions written after the last checkpoint
+    with open(output_fn, 'ab') as f_out:
+        f_out.truncate(output_offset)
+
+    with codecs.open(output_fn, 'a', 'utf-8') as f_out:
+        while True:
+
+            # Check before reading, so that all the lines are read after the file is complete
+            is_complete = os.path.exists(input_fn) and not os.path.exists(input_fn + PARTIAL_SUFFIX)
+            lines = read_complete_lines(f_in, LINES_PER_CHUNK, is_complete)
+
+            if len(lines) == 0:
+                if is_complete:
+                    break
+
+                time.sleep(poll_interval)
+                continue
+
+            if pool is not None:
+                # Split the new lines between the workers
+                chunk_size = len(lines) / workers + 1
+                chunks = [lines[i:i + chunk_size] for i in range(0, len(lines), chunk_size)]
+                out_lines_by_chunk = []
+                for chunk_out_lines, chunk_stats in pool.map(extract_chunk, chunks):
+                    stats.merge(chunk_stats)
+                    out_lines_by_chunk.extend(chunk_out_lines)
             else:
-                # Not at tweet, just fill in the id with a place holder
-                tweet_id = 'NONE'
-                sent = data[0]
-            logging.info('Read: {}'.format(sent))
-            for ex in prop_ex.get_extractions(sent):
-                to_print = '\t'.join(map(str, [tweet_id, sent, ex])).decode('ascii', errors = 'ignore')
-                logging.debug(to_print)
-                f_out.write(to_print + "\n")
-                ex_counter += 1
+                out_lines_by_chunk = extract_records(read_sentences(lines), prop_ex, batch_size)
+
+            for out_lines in out_lines_by_chunk:
+                line_counter += 1
+                ex_counter += write_extractions(f_out, out_lines)
+
+            f_out.flush()
+            os.fsync(f_out.fileno())
+            save_checkpoint(checkpoint_fn, f_in.tell(), f_out.tell())
 
+    f_in.close()
     logging.info('Done! Wrote {} extractions to {}'.format(ex_counter, output_fn))
+    report_stats(stats, output_fn, profile)
     return line_counter, ex_counter
 
 
+def open_growing_file(input_fn, poll_interval):
+    """
+    Open a file which is being written as input_fn.part, or input_fn if it is complete, waiting until either exists.
+    The file may be renamed while it is open.
+    :param input_fn: the input file name
+    :param poll_interval: the time in seconds to wait for the file
+    :return the open file
+    """
+    while True:
+        for fn in [input_fn + PARTIAL_SUFFIX, input_fn]:
+            try:
+                return open(fn, 'rb')
+            except IOError:
+                pass
+
+        time.sleep(poll_interval)
+
+
+def read_complete_lines(f_in, max_lines, is_complete = False):
+    """
+    Read the lines which were completely written from a growing file
+    :param f_in: the input file, opened in binary mode so its position can be restored (the lines are decoded
+    by the parser, as in run_single_file)
+    :param max_lines: the maximal number of lines to read
+    :param is_complete: whether the file is complete, so the last line is read even without a new line character
+    :return the lines, and the file position is after the last one
+    """
+    lines = []
+
+    while len(lines) < max_lines:
+        offset = f_in.tell()
+        line = f_in.readline()
+
+        if line == '' or (not line.endswith('\n') and not is_complete):
+            f_in.seek(offset)
+            break
+
+        lines.append(line)
+
+    return lines
+
+
+def load_checkpoint(checkpoint_fn):
+    """
+    Load the input and output offsets of the last checkpoint
+    :param checkpoint_fn: the checkpoint file name
+    :return the input and output offsets (0, 0 if there is no checkpoint)
+    """
+    if not os.path.exists(checkpoint_fn):
+        return 0, 0
+
+    with open(checkpoint_fn) as f_in:
+        input_offset, output_offset = map(int, f_in.read().split('\t'))
+
+    return input_offset, output_offset
+
+
+def save_checkpoint(checkpoint_fn, input_offset, output_offset):
+    """
+    Save the input and output offsets. The previous checkpoint is replaced only after the new one was written.
+    :param checkpoint_fn: the checkpoint file name
+    :param input_offset: the offset after the last processed input line
+    :param output_offset: the size of the output file, with the extractions of the processed lines
+    """
+    with open(checkpoint_fn + '.tmp', 'w') as f_out:
+        f_out.write('{}\t{}'.format(input_offset, output_offset))
+
+    os.rename(checkpoint_fn + '.tmp', checkpoint_fn)
+
+
+def report_stats(stats, output_fn, profile = False):
+    """
+    Log the timing and failure statistics of an input file, and optionally write the slowest and failing
+    sentences to a side file
+    :param stats: the ExtractionStats of the input file
+    :param output_fn: the output file name
+    :param profile: whether to write the slowest and failing sentences to output_fn.profile
+    """
+    logging.info('Statistics for {}:\n{}'.format(output_fn, stats.summary()))
+
+    if profile:
+        stats.dump(output_fn + '.profile')
+        logging.info('Wrote the slowest and failing sentences to {}'.format(output_fn + '.profile'))
+
+
+def init_worker(batch_size, profile = False):
+    """
+    Initialize a worker process: load the proposition extraction (and spaCy) once per process
+    :param batch_size: the number of sentences to parse together
+    :param profile: whether to write the slowest and failing sentences of each input file to a side file
+    """
+    global worker_prop_ex, worker_batch_size, worker_profile
+    worker_prop_ex = prop_extraction()
+    worker_batch_size = batch_size
+    worker_profile = profile
+
+
+def run_single_file_worker(file_pair):
+    """
+    Process extractions from a single input file in a worker process
+    :param file_pair: (input file name, output file name)
+    :return (#lines, #num of extractions)
+    """
+    input_fn, output_fn = file_pair
+    return run_single_file(input_fn, output_fn, worker_prop_ex, worker_batch_size, worker_profile)
+
+
+def extract_chunk(lines):
+    """
+    Process extractions from a chunk of input lines in a worker process
+    :param lines: the input lines
+    :return a list of lists of output lines, one list for each input line, and the ExtractionStats of the chunk
+    """
+    worker_prop_ex.stats = ExtractionStats()
+    out_lines = list(extract_records(read_sentences(lines), worker_prop_ex, worker_batch_size))
+    return out_lines, worker_prop_ex.stats
+
+
+def extract_records(records, prop_ex, batch_size = 1):
+    """
+    Process extractions from (tweet id, sentence) records
+    :param records: an iterable of (tweet id, sentence) tuples
+    :param prop_ex: the proposition extraction object
+    :param batch_size: the number of sentences to parse together (1 parses each sentence separately)
+    :return a generator of lists of output lines, one list for each record
+    """
+    records, sents = itertools.tee(records)
+    sents = (sent for _, sent in sents)
+
+    if batch_size > 1:
+        extractions = prop_ex.get_extractions_batch(sents, batch_size)
+    else:
+        extractions = (prop_ex.get_extractions(sent) for sent in sents)
+
+    for (tweet_id, sent), sent_extractions in itertools.izip(records, extractions):
+        yield ['\t'.join(map(str, [tweet_id, sent, ex])).decode('ascii', errors = 'ignore')
+               for ex in sent_extractions]
+
+
+def write_extractions(f_out, out_lines):
+    """
+    Write the output lines of a single sentence
+    :param f_out: the output file
+    :param out_lines: the output lines
+    :return the number of extractions written
+    """
+    for to_print in out_lines:
+        logging.debug(to_print)
+        f_out.write(to_print + "\n")
+
+    return len(out_lines)
+
+
+def read_sentences(lines):
+    """
+    Read the sentences from input lines
+    :param lines: the input lines (e.g. an open input file)
+    :return a generator of (tweet id, sentence) tuples, one for each line
+    """
+    for line in lines:
+        data = line.strip().split('\t')
+        tweet_id = None
+        if len(data) == 2:
+            tweet_id, sent = data
+        elif len(data) == 4:
+            date, tweet_id, user, sent = data
+        else:
+            # Not at tweet, just fill in the id with a place holder
+            tweet_id = 'NONE'
+            sent = data[0]
+        logging.info('Read: {}'.format(sent))
+        yield tweet_id, sent
+
+
+def open_input(input_fn):
+    """
+    Open an input file, decompressing it if it ends with .gz
+    :param input_fn: the input file name
+    :return the open file
+    """
+    if input_fn.endswith('.gz'):
+        return gzip.open(input_fn)
+
+    return open(input_fn)
+
+
 def path_leaf(path):
     """
     Get just the filename from the full path.
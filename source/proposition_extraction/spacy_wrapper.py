@@ -24,15 +24,33 @@ class spacy_wrapper:
         # store them here instead - this is supported only for VP chunk
         self.reset()
         self.idx_to_word_index = {}
+        self.toks = []
+        self.index()
 
     def parse(self, sent):
         """
         Parse a raw sentence - shouldn't return a value, but properly change the internal status
         :param sent - a raw sentence
         """
+        self.set_doc(self.nlp(unicode(sent, errors = 'ignore')))
+
+    def pipe(self, sents, batch_size = 1000):
+        """
+        Parse a stream of raw sentences in batches, using spaCy's pipe
+        :param sents - an iterable of raw sentences
+        :param batch_size - the number of sentences to parse in each batch
+        :return a generator of parsed documents, in the order of sents. Each should be passed to set_doc.
+        """
+        return self.nlp.pipe((unicode(sent, errors = 'ignore') for sent in sents), batch_size = batch_size)
+
+    def set_doc(self, doc):
+        """
+        Set an already parsed document (e.g. yielded by pipe) as the current sentence
+        :param doc - a parsed spaCy document
+        """
         self.reset()
-        self.toks = self.nlp(unicode(sent, errors = 'ignore'))
-        self.idx_to_word_index = self.get_idx_to_word_index()
+        self.toks = doc
+        self.index()
 
     def reset(self):
         """
@@ -64,7 +82,7 @@ class spacy_wrapper:
             np.merge(np.root.tag_, np.text, np.root.ent_type_)
 
         # Update mappings
-        self.idx_to_word_index = self.get_idx_to_word_index()
+        self.index()
 
     def vp_chunk(self):
         """
@@ -138,7 +156,23 @@ class spacy_wrapper:
             chunk.merge(chunk.root.tag_, chunkLemma, chunk.root.ent_type_) # tag, lemma, ent_type
 
         # Update mappings
+        self.index()
+
+    def index(self):
+        """
+        Precompute the information of each token in the current sentence, which is used by all the accessors,
+        so that they are list lookups rather than calls to spaCy tokens.
+        This should be called whenever the tokens change: after parsing and after each chunking (merging) pass.
+        """
         self.idx_to_word_index = self.get_idx_to_word_index()
+        self.tags = [tok.tag_ for tok in self.toks]
+        self.rels = [tok.dep_ for tok in self.toks]
+        self.words = [tok.orth_ for tok in self.toks]
+        self.lemmas = [tok.lemma_ for tok in self.toks]
+        self.texts = [tok.text for tok in self.toks]
+        self.char_starts = [tok.idx for tok in self.toks]
+        self.heads = [self.idx_to_word_index[tok.head.idx] for tok in self.toks]
+        self.children = [sorted([self.idx_to_word_index[child.idx] for child in tok.children]) for tok in self.toks]
 
     def get_idx_to_word_index(self):
         """
@@ -153,7 +187,7 @@ class spacy_wrapper:
         :param ind: the index
         :return: the pos of token at index ind
         """
-        return self.toks[ind].tag_
+        return self.tags[ind]
 
     def get_rel(self, ind):
         """
@@ -161,7 +195,7 @@ class spacy_wrapper:
         :param ind: the index
         :return: the dependency relation of token at index ind
         """
-        return self.toks[ind].dep_
+        return self.rels[ind]
 
     def get_word(self, ind):
         """
@@ -169,7 +203,7 @@ class spacy_wrapper:
         :param ind: the index
         :return: the surface form of token at index ind
         """
-        return self.toks[ind].orth_
+        return self.words[ind]
 
     def get_lemma(self, ind):
         """
@@ -177,7 +211,7 @@ class spacy_wrapper:
         :param ind: the index
         :return: the surface form of token at index ind
         """
-        return self.toks[ind].lemma_
+        return self.lemmas[ind]
 
     def get_head(self, ind):
         """
@@ -185,7 +219,7 @@ class spacy_wrapper:
         :param ind: the index
         :return: the word index of the head of of token at index ind
         """
-        return self.idx_to_word_index[self.toks[ind].head.idx]
+        return self.heads[ind]
 
     def get_children(self, ind):
         """
@@ -193,9 +227,7 @@ class spacy_wrapper:
         :param ind: the index
         :return: a sorted list of children of a token
         """
-
-        # TODO: do we have to use sorted here? Maybe spaCy already returns a sorted list of children
-        return sorted([self.idx_to_word_index[child.idx] for child in self.toks[ind].children])
+        return self.children[ind]
 
     def get_char_start(self, ind):
         """
@@ -203,7 +235,7 @@ class spacy_wrapper:
         :param ind: the index
         :return: the start character index of this word
         """
-        return self.toks[ind].idx
+        return self.char_starts[ind]
 
     def get_char_end(self, ind):
         """
@@ -211,7 +243,7 @@ class spacy_wrapper:
         :param ind: the index
         :return: the end character index of this word
         """
-        return self.toks[ind].idx + len(self.get_word(ind))
+        return self.char_starts[ind] + len(self.get_word(ind))
 
     def is_root(self, ind):
         """
@@ -219,14 +251,14 @@ class spacy_wrapper:
         :param ind: the index
         :return: True iff the token at index ind is the head of this tree
         """
-        return (self.toks[ind].head is self.toks[ind])
+        return self.heads[ind] == ind
 
     def get_len(self):
         """
         Returns the number of tokens in the current sentence
         :return: the number of tokens in the current sentence
         """
-        return len(self.toks)
+        return len(self.tags)
 
     def is_verb(self, ind):
         """
@@ -328,7 +360,7 @@ class spacy_wrapper:
         :param ind: the index
         :return: the text of this node
         """
-        return self.toks[ind].text
+        return self.texts[ind]
 
         
 def consecutive(span):
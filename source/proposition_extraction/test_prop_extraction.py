@@ -0,0 +1,141 @@
+"""
+Tests of the batch parsing and the follow mode of prop_extraction, with the spaCy model (run from this directory:
+python -m unittest test_prop_extraction)
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+
+from extraction_stats import ExtractionStats
+from prop_extraction import prop_extraction, run_single_file, run_single_file_follow, save_checkpoint, \
+    PARTIAL_SUFFIX
+
+# Tweets in the format written by get_news_tweets_stream: date, tweet id, user and text
+TWEETS = ['Mon Oct 10 10:00:00 +0000 2016\t1\tnews\tObama met Putin in Moscow on Monday.\n',
+          'Mon Oct 10 10:00:01 +0000 2016\t2\tnews\tThe company announced a new phone.\n',
+          'Mon Oct 10 10:00:02 +0000 2016\t3\tnews\tApple released the new iPhone in California.\n']
+
+
+class BatchTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prop_ex = prop_extraction()
+
+    def setUp(self):
+        self.sents = [tweet.rstrip('\n').split('\t')[3] for tweet in TWEETS]
+        self.expected = [self.prop_ex.get_extractions(sent) for sent in self.sents]
+        self.prop_ex.stats = ExtractionStats()
+
+    def test_batch(self):
+        self.assertEqual(self.expected, list(self.prop_ex.get_extractions_batch(self.sents, 2)))
+        self.assertEqual(0, sum(self.prop_ex.stats.failed_batches.values()))
+
+    def test_failed_batch(self):
+        def failing_pipe(sents, batch_size):
+            raise ValueError('failed batch')
+
+        # Each batch is parsed again one sentence at a time
+        self.prop_ex.parser.pipe = failing_pipe
+
+        try:
+            self.assertEqual(self.expected, list(self.prop_ex.get_extractions_batch(self.sents, 2)))
+        finally:
+            del self.prop_ex.parser.pipe
+
+        self.assertEqual({'ValueError': 2}, dict(self.prop_ex.stats.failed_batches))
+        self.assertEqual(0, sum(self.prop_ex.stats.failures.values()))
+        self.assertEqual(len(self.sents), len(self.prop_ex.stats.total_times))
+
+
+class FollowTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.prop_ex = prop_extraction()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.tweets_file = os.path.join(self.dir, 'tweets')
+        self.prop_file = os.path.join(self.dir, 'tweets.prop')
+
+        # The extractions of the complete file
+        expected_tweets_file = os.path.join(self.dir, 'expected')
+        with open(expected_tweets_file, 'wb') as f_out:
+            f_out.write(''.join(TWEETS))
+
+        run_single_file(expected_tweets_file, expected_tweets_file + '.prop', self.prop_ex)
+
+        with open(expected_tweets_file + '.prop', 'rb') as f_in:
+            self.expected = f_in.read()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read_output(self):
+        with open(self.prop_file, 'rb') as f_in:
+            return f_in.read()
+
+    def test_complete_file(self):
+        with open(self.tweets_file, 'wb') as f_out:
+            f_out.write(''.join(TWEETS))
+
+        num_of_lines, num_of_extractions = run_single_file_follow(self.tweets_file, self.prop_file, self.prop_ex)
+        self.assertEqual(len(TWEETS), num_of_lines)
+        self.assertGreater(num_of_extractions, 0)
+        self.assertEqual(0, sum(self.prop_ex.stats.failures.values()))
+        self.assertEqual(self.expected, self.read_output())
+
+    def test_batch(self):
+        with open(self.tweets_file, 'wb') as f_out:
+            f_out.write(''.join(TWEETS))
+
+        run_single_file_follow(self.tweets_file, self.prop_file, self.prop_ex, batch_size = 2)
+        self.assertEqual(self.expected, self.read_output())
+
+    def test_growing_file(self):
+        with open(self.tweets_file + PARTIAL_SUFFIX, 'wb') as f_out:
+
+            # The first tweet and half of the second one
+            f_out.write(TWEETS[0] + TWEETS[1][:20])
+            f_out.flush()
+
+            follower = threading.Thread(target = run_single_file_follow,
+                                        args = (self.tweets_file, self.prop_file, self.prop_ex),
+                                        kwargs = { 'poll_interval' : 0.01 })
+            follower.start()
+            f_out.write(TWEETS[1][20:] + TWEETS[2])
+
+        os.rename(self.tweets_file + PARTIAL_SUFFIX, self.tweets_file)
+        follower.join()
+        self.assertEqual(self.expected, self.read_output())
+
+    def test_restart(self):
+        with open(self.tweets_file, 'wb') as f_out:
+            f_out.write(''.join(TWEETS))
+
+        # A checkpoint after the first tweet, followed by extractions which were written before a crash
+        with open(self.prop_file, 'wb') as f_out:
+            f_out.write('partial extraction\n')
+
+        save_checkpoint(self.prop_file + '.checkpoint', len(TWEETS[0]), 0)
+        run_single_file_follow(self.tweets_file, self.prop_file, self.prop_ex)
+
+        expected_tail = os.path.join(self.dir, 'expected_tail')
+        with open(expected_tail, 'wb') as f_out:
+            f_out.write(''.join(TWEETS[1:]))
+
+        run_single_file(expected_tail, expected_tail + '.prop', self.prop_ex)
+
+        with open(expected_tail + '.prop', 'rb') as f_in:
+            self.assertEqual(f_in.read(), self.read_output())
+
+    def test_compressed_file(self):
+        self.assertRaises(ValueError, run_single_file_follow, self.tweets_file + '.gz', self.prop_file, self.prop_ex)
+        self.assertFalse(os.path.exists(self.prop_file))
+
+
+if __name__ == '__main__':
+    unittest.main()